@@ -5,12 +5,25 @@ import os
 from google.genai import types
 
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+# SDK-level retries stay short (worst case ~2s of backoff per request); longer outages are handled
+# by the deadline-bounded retries, circuit breakers and model fallback in tools/resilience.py.
 DEFAULT_RETRY = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
+    attempts=3,
+    exp_base=2,
+    initial_delay=0.5,
+    max_delay=4,
+    jitter=0.5,
     http_status_codes=[429, 500, 503, 504],
 )
+# Bound on each model request inside an agent run (not on the run as a whole), in seconds.
+MODEL_CALL_TIMEOUT_S = float(os.getenv("MODEL_CALL_TIMEOUT_S", "60"))
+
+
+def model_call_config() -> types.GenerateContentConfig:
+    """
+    Generation config for routed agents: every model request times out after MODEL_CALL_TIMEOUT_S.
+    """
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(MODEL_CALL_TIMEOUT_S * 1000)))
 
 
 def get_api_key() -> str:
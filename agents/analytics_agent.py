@@ -1,8 +1,10 @@
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
 from tools.analysis_tools import compute_basic_metrics, compute_trade_stats
+from tools.indicators import get_technical_indicators
+from tools.positions import compute_positions
 from tools.data_tools import (
     load_prices,
     load_trades,
@@ -18,15 +20,21 @@ def create_analytics_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
     model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
     return LlmAgent(
         model=model,
+        generate_content_config=model_call_config(),
         name="AnalyticsAgent",
         description="Computes basic performance metrics and writes an analysis report.",
         instruction="""
         Given a dataset_ref or symbol/address, use the tools to fetch data and compute metrics
-        (returns, volatility, max drawdown, trade counts). Return JSON:
+        (returns, volatility, max drawdown, trade counts). For an address or portfolio, call
+        compute_positions for per-symbol positions, realized/unrealized PnL and exposure. For momentum,
+        trend and volatility signals call get_technical_indicators (RSI, EMA/MACD, ATR, Bollinger,
+        VWAP; pass history=N for a short series) rather than fetching and narrating raw klines. Return JSON:
         {
           "symbol": ...,
           "metrics": {...},
           "trade_stats": {...},
+          "indicators": {...} (optional),
+          "positions": {...} (optional),
           "summary": "short natural language overview"
         }
         If data is missing, state it clearly.
@@ -38,5 +46,7 @@ def create_analytics_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
             load_trades,
             compute_basic_metrics,
             compute_trade_stats,
+            compute_positions,
+            get_technical_indicators,
         ],
     )
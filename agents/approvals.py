@@ -0,0 +1,136 @@
+"""
+Approval queue for trade stages paused on adk_request_confirmation.
+
+When AUTO_APPROVE_TRADES=0 the orchestrator does not wait for a human: it parks the paused
+TradingAgent run here (runner + session ids + invocation id) and the workflow moves on with a
+"pending_approval" trade plan. TradingOrchestrator.resolve_approval() later resumes the run.
+The queue is bounded: entries expire after timeout_s and, when max_pending is reached, the
+oldest entry is evicted first. An expired or evicted run is never resumed, so its trade is not
+executed; the queue records a terminal "expired"/"evicted" outcome (as it does "approved"/
+"rejected" for resolved entries) that callers can look up by approval_id via outcome().
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from tools.telemetry import METRICS
+
+APPROVAL_TIMEOUT_S = float(os.getenv("APPROVAL_TIMEOUT_S", "900"))
+MAX_PENDING_APPROVALS = int(os.getenv("MAX_PENDING_APPROVALS", "100"))
+# Terminal outcomes kept for lookup after an entry leaves the queue.
+MAX_APPROVAL_OUTCOMES = 1000
+
+
+class PendingApproval:
+    __slots__ = ("approval_id", "function_call_id", "invocation_id", "runner", "user_id", "session_id", "context", "draft", "created", "expires_at")
+
+    def __init__(
+        self,
+        function_call_id: str,
+        invocation_id: str,
+        runner: Any,
+        user_id: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]] = None,
+        draft: str = "",
+        timeout_s: float = APPROVAL_TIMEOUT_S,
+    ):
+        self.approval_id = uuid.uuid4().hex
+        self.function_call_id = function_call_id
+        self.invocation_id = invocation_id
+        self.runner = runner
+        self.user_id = user_id
+        self.session_id = session_id
+        self.context = context or {}
+        self.draft = draft
+        self.created = time.time()
+        self.expires_at = self.created + timeout_s
+
+    def public(self) -> Dict[str, Any]:
+        return {
+            "approval_id": self.approval_id,
+            "status": "pending_approval",
+            "created_at": self.created,
+            "expires_at": self.expires_at,
+            **self.context,
+        }
+
+
+class ApprovalQueue:
+    """
+    Bounded, thread-safe map of approval_id -> PendingApproval in arrival order, plus the
+    terminal outcome of entries that left it.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = MAX_PENDING_APPROVALS,
+        timeout_s: float = APPROVAL_TIMEOUT_S,
+        max_outcomes: int = MAX_APPROVAL_OUTCOMES,
+    ):
+        self.max_pending = max_pending
+        self.timeout_s = timeout_s
+        self.max_outcomes = max_outcomes
+        self._entries: "OrderedDict[str, PendingApproval]" = OrderedDict()
+        self._outcomes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _finish(self, entry: PendingApproval, status: str, **extra: Any) -> Dict[str, Any]:
+        outcome = {"approval_id": entry.approval_id, "status": status, "resolved_at": time.time(), **entry.context, **extra}
+        self._outcomes[entry.approval_id] = outcome
+        while len(self._outcomes) > self.max_outcomes:
+            self._outcomes.popitem(last=False)
+        return outcome
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for key in expired:
+            self._finish(self._entries.pop(key), "expired", trade_plan={"status": "expired", "executed": False})
+        if expired:
+            METRICS.inc("approvals_total", len(expired), status="expired")
+
+    def park(self, entry: PendingApproval) -> PendingApproval:
+        with self._lock:
+            self._expire(time.time())
+            while len(self._entries) >= self.max_pending:
+                _, evicted = self._entries.popitem(last=False)
+                self._finish(evicted, "evicted", trade_plan={"status": "evicted", "executed": False})
+                METRICS.inc("approvals_total", status="evicted")
+            self._entries[entry.approval_id] = entry
+        METRICS.inc("approvals_total", status="parked")
+        return entry
+
+    def pop(self, approval_id: str) -> Optional[PendingApproval]:
+        """
+        Claim an entry for resumption (None if unknown, already resolved or expired).
+        """
+        with self._lock:
+            self._expire(time.time())
+            return self._entries.pop(approval_id, None)
+
+    def record(self, entry: PendingApproval, status: str, **extra: Any) -> Dict[str, Any]:
+        """
+        Store the terminal outcome of a popped (resolved) entry.
+        """
+        with self._lock:
+            return self._finish(entry, status, **extra)
+
+    def outcome(self, approval_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Terminal outcome (approved/rejected/error/expired/evicted) of an entry no longer pending, if known.
+        """
+        with self._lock:
+            self._expire(time.time())
+            return self._outcomes.get(approval_id)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._expire(time.time())
+            return [e.public() for e in self._entries.values()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
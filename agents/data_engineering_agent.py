@@ -1,7 +1,7 @@
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
 from tools.data_tools import synthesize_dataset_ref, fetch_binance_spot_klines, fetch_binance_agg_trades
 
 
@@ -13,6 +13,7 @@ def create_data_engineering_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
     model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
     return LlmAgent(
         model=model,
+        generate_content_config=model_call_config(),
         name="DataEngineeringAgent",
         description="Designs lightweight data pipelines and emits dataset references.",
         instruction="""
@@ -6,7 +6,9 @@ endpoints by replacing the call_* helpers with real A2A clients.
 import os
 import asyncio
 import json
-from typing import Any, Dict, List, Optional
+import time
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from google.genai import types
 from google.adk.models.google_llm import Gemini
@@ -14,15 +16,34 @@ from google.adk.agents import LlmAgent
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
 from agents.analytics_agent import create_analytics_agent
+from agents.approvals import ApprovalQueue, PendingApproval
 from agents.data_engineering_agent import create_data_engineering_agent
 from agents.risk_agent import create_risk_agent
+from agents.routing import ModelRouter
 from agents.search_agent import create_search_agent
 from agents.trading_agent import create_trading_agent
 from agents.memory import get_user_profile, upsert_user_profile
 from tools.reporting import save_report
+from tools.prefetch import start_prefetch
+from tools.resilience import (
+    LLM_RETRY,
+    CircuitOpenError,
+    DeadlineExceeded,
+    acall_with_retry,
+    budget,
+    get_breaker,
+    is_upstream_error,
+)
+from tools.screener import screen_universe
 from tools.context import compact_messages
+from tools.telemetry import METRICS, record_fallback, record_tokens, span
+
+
+SCREENER_TOP_K = int(os.getenv("SCREENER_TOP_K", "10"))
+# Approval resumes are never retried (see resolve_approval).
+RESUME_POLICY = replace(LLM_RETRY, attempts=1)
 
 
 async def _invoke(agent: LlmAgent, user_text: str) -> str:
@@ -35,24 +56,60 @@ async def _invoke(agent: LlmAgent, user_text: str) -> str:
     await session_service.create_session(app_name="invoke-app", user_id="invoke-user", session_id="invoke-session")
     runner = Runner(agent=agent, app_name="invoke-app", session_service=session_service)
     chunks = []
-    async for event in runner.run_async(
-        user_id="invoke-user",
-        session_id="invoke-session",
-        new_message=types.Content(role="user", parts=[types.Part(text=user_text)]),
-    ):
-        if getattr(event, "content", None) and event.content.parts:
-            for part in event.content.parts:
-                if getattr(part, "text", None):
-                    chunks.append(part.text)
-                if getattr(part, "function_response", None) and part.function_response:
-                    try:
-                        import json as _json
-                        chunks.append(_json.dumps(part.function_response.response))
-                    except Exception:
-                        pass
+    with span(agent.name, kind="llm") as record:
+        async for event in runner.run_async(
+            user_id="invoke-user",
+            session_id="invoke-session",
+            new_message=types.Content(role="user", parts=[types.Part(text=user_text)]),
+        ):
+            record_tokens(agent.name, getattr(event, "usage_metadata", None), record)
+            if getattr(event, "content", None) and event.content.parts:
+                for part in event.content.parts:
+                    if getattr(part, "text", None):
+                        chunks.append(part.text)
+                    if getattr(part, "function_response", None) and part.function_response:
+                        try:
+                            import json as _json
+                            chunks.append(_json.dumps(part.function_response.response))
+                        except Exception:
+                            pass
     return "\n".join(chunks).strip()
 
 
+def _create_summary_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
+    """
+    Orchestrator-owned agent that turns per-idea results into the final markdown report.
+    """
+    return LlmAgent(
+        model=Gemini(model=model_name, retry_options=DEFAULT_RETRY),
+        generate_content_config=model_call_config(),
+        name="SummaryAgent",
+        description="Summarize orchestrator results",
+        instruction="""
+        Create a concise markdown report from orchestrator outputs.
+        Include: ideas considered, key metrics, risk levels, trade plan highlights, cautions.
+        """,
+    )
+
+
+def _partial_summary(request: str, results: List[Dict[str, Any]]) -> str:
+    """
+    Local report used when the time budget ran out before the SummaryAgent could run.
+    """
+    done = [r for r in results if r.get("status") != "deadline_exceeded"]
+    lines = [
+        "# Partial report (time budget exceeded)",
+        "",
+        f"Request: {request}",
+        f"Ideas completed: {len(done)} of {len(results)}",
+        "",
+        "```json",
+        json.dumps(results, indent=2, default=str),
+        "```",
+    ]
+    return "\n".join(lines)
+
+
 def _safe_json(text: str) -> Any:
     try:
         return json.loads(text)
@@ -71,62 +128,231 @@ class TradingOrchestrator:
       6) assemble a human-friendly report
     """
 
-    def __init__(self, model_name: str = DEFAULT_MODEL):
-        # Orchestrator uses Gemini mainly to summarize final output.
-        self.model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
-        self.search_agent = create_search_agent(model_name)
-        self.de_agent = create_data_engineering_agent(model_name)
-        self.analytics_agent = create_analytics_agent(model_name)
-        self.risk_agent = create_risk_agent(model_name)
-        self.trading_agent = create_trading_agent(model_name)
+    def __init__(self, model_name: str = DEFAULT_MODEL, router: Optional[ModelRouter] = None):
+        # Models are assigned per agent (and per call) by the router; agents are built lazily per model.
+        self.router = router or ModelRouter.from_env(default_model=model_name)
+        self._factories: Dict[str, Callable[[str], LlmAgent]] = {
+            "SearchAgent": create_search_agent,
+            "DataEngineeringAgent": create_data_engineering_agent,
+            "AnalyticsAgent": create_analytics_agent,
+            "RiskAgent": create_risk_agent,
+            "TradingAgent": create_trading_agent,
+            "SummaryAgent": _create_summary_agent,
+        }
+        self._agents: Dict[Tuple[str, str], LlmAgent] = {}
+        # Trade stages paused for human approval (AUTO_APPROVE_TRADES=0); see resolve_approval().
+        self.approvals = ApprovalQueue()
+        self.search_agent = self._agent("SearchAgent", self.router.primary("SearchAgent"))
+        self.de_agent = self._agent("DataEngineeringAgent", self.router.primary("DataEngineeringAgent"))
+        self.analytics_agent = self._agent("AnalyticsAgent", self.router.primary("AnalyticsAgent"))
+        self.risk_agent = self._agent("RiskAgent", self.router.primary("RiskAgent"))
+        self.trading_agent = self._agent("TradingAgent", self.router.primary("TradingAgent"))
 
-    async def _invoke_with_approval(self, agent: LlmAgent, user_text: str, auto_approve: bool = True) -> str:
+    def _agent(self, name: str, model_name: str) -> LlmAgent:
+        key = (name, model_name)
+        if key not in self._agents:
+            self._agents[key] = self._factories[name](model_name)
+        return self._agents[key]
+
+    async def _routed(self, name: str, call: Callable[[LlmAgent], Awaitable[str]]) -> str:
+        """
+        Run call(agent) on the router's model for this agent, under that model's circuit breaker
+        with deadline-bounded, jittered retries (LLM_RETRY). If the model keeps failing or its
+        breaker is open, fall through to the next model in the agent's chain. The workflow
+        budget bounds the whole thing.
+        """
+        skip = set()
+        last_error: Optional[Exception] = None
+        while True:
+            skip |= {m for m in self.router.chain(name) if get_breaker(f"gemini:{m}").is_open()}
+            model_name = self.router.select(name, exclude=skip)
+            if model_name is None:
+                raise last_error or CircuitOpenError(f"No available model for {name}")
+            skip.add(model_name)
+            start = time.perf_counter()
+            try:
+                result = await acall_with_retry(
+                    f"gemini:{model_name}", call, self._agent(name, model_name), policy=LLM_RETRY
+                )
+            except DeadlineExceeded:
+                raise
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            except Exception as e:
+                if not is_upstream_error(e):
+                    # A local error would repeat on every model; it says nothing about this one.
+                    raise
+                self.router.record(model_name, time.perf_counter() - start, ok=False, agent_name=name)
+                record_fallback(f"model:{name}", reason="error")
+                last_error = e
+                continue
+            self.router.record(model_name, time.perf_counter() - start, ok=True, agent_name=name)
+            return result
+
+    async def _invoke_with_approval(
+        self, agent: LlmAgent, user_text: str, auto_approve: bool = True, context: Optional[Dict[str, Any]] = None
+    ) -> str:
         """
         Run an agent that may pause for human approval (adk_request_confirmation).
-        If pause detected, auto-approve unless overridden via AUTO_APPROVE_TRADES=0 env.
+        Events are consumed as they stream and the confirmation request is picked up on arrival.
+        With auto_approve the run is resumed inline; otherwise it is parked in the approval queue
+        and a pending_approval stub is returned so the workflow keeps going (see resolve_approval).
         """
         session_service = InMemorySessionService()
         runner = Runner(agent=agent, session_service=session_service)
-        events = []
-        async for event in runner.run_async(user_id="trade-user", session_id="trade-session", new_message=types.Content(role="user", parts=[types.Part(text=user_text)])):
-            events.append(event)
-
-        approval_event = None
-        for e in events:
-            if getattr(e, "content", None) and e.content.parts:
-                for part in e.content.parts:
-                    if getattr(part, "function_call", None) and part.function_call.name == "adk_request_confirmation":
-                        approval_event = {
-                            "approval_id": part.function_call.id,
-                            "invocation_id": e.invocation_id,
-                        }
-                        break
-        if approval_event:
-            approve_flag = auto_approve
-            # Build FunctionResponse back to agent
-            confirmation_response = types.FunctionResponse(
-                id=approval_event["approval_id"],
-                name="adk_request_confirmation",
-                response={"confirmed": approve_flag},
-            )
-            approval_message = types.Content(role="user", parts=[types.Part(function_response=confirmation_response)])
-            async for event in runner.run_async(
-                user_id="trade-user",
-                session_id="trade-session",
-                new_message=approval_message,
-                invocation_id=approval_event["invocation_id"],
-            ):
-                events.append(event)
-
-        # Gather text parts
         chunks = []
-        for event in events:
-            if getattr(event, "content", None) and event.content.parts:
+        request = None
+        with span(agent.name, kind="llm") as record:
+            async for event in runner.run_async(user_id="trade-user", session_id="trade-session", new_message=types.Content(role="user", parts=[types.Part(text=user_text)])):
+                record_tokens(agent.name, getattr(event, "usage_metadata", None), record)
+                if not (getattr(event, "content", None) and event.content.parts):
+                    continue
                 for part in event.content.parts:
                     if getattr(part, "text", None):
                         chunks.append(part.text)
+                    call = getattr(part, "function_call", None)
+                    if call and call.name == "adk_request_confirmation" and request is None:
+                        request = (call.id, event.invocation_id)
+                        record["attrs"]["approval_requested"] = True
+
+        if request is None:
+            return "\n".join(chunks).strip()
+        if not auto_approve:
+            entry = self.approvals.park(
+                PendingApproval(
+                    request[0], request[1], runner, "trade-user", "trade-session",
+                    context=context, draft="\n".join(chunks).strip(), timeout_s=self.approvals.timeout_s,
+                )
+            )
+            return json.dumps(entry.public())
+        chunks.extend(await self._resume(runner, "trade-user", "trade-session", request[0], request[1], approved=True))
         return "\n".join(chunks).strip()
 
+    async def _resume(
+        self, runner: Runner, user_id: str, session_id: str, function_call_id: str, invocation_id: str, approved: bool
+    ) -> List[str]:
+        """
+        Answer a pending adk_request_confirmation and collect the text of the resumed run.
+        """
+        confirmation_response = types.FunctionResponse(
+            id=function_call_id,
+            name="adk_request_confirmation",
+            response={"confirmed": approved},
+        )
+        approval_message = types.Content(role="user", parts=[types.Part(function_response=confirmation_response)])
+        chunks = []
+        with span(runner.agent.name, kind="llm", resumed=True, approved=approved) as record:
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=approval_message,
+                invocation_id=invocation_id,
+            ):
+                record_tokens(runner.agent.name, getattr(event, "usage_metadata", None), record)
+                if getattr(event, "content", None) and event.content.parts:
+                    chunks.extend(part.text for part in event.content.parts if getattr(part, "text", None))
+        return chunks
+
+    def pending_approvals(self) -> List[Dict[str, Any]]:
+        """Trade stages currently parked for human approval."""
+        return self.approvals.pending()
+
+    def approval_status(self, approval_id: str) -> Dict[str, Any]:
+        """
+        Current state of a parked trade stage: pending, its terminal outcome, or "not_found".
+        """
+        for entry in self.approvals.pending():
+            if entry["approval_id"] == approval_id:
+                return entry
+        return self.approvals.outcome(approval_id) or {"approval_id": approval_id, "status": "not_found"}
+
+    async def resolve_approval(self, approval_id: str, approved: bool) -> Dict[str, Any]:
+        """
+        Approve or reject a parked trade stage and finish its TradingAgent run.
+        Returns the final trade plan. For an id that is no longer pending it returns the recorded
+        outcome (approved/rejected, expired/evicted: never resumed, not executed, or error: the
+        resume failed), or status "not_found" for unknown ids. If the model's breaker is open the
+        entry stays parked and CircuitOpenError is raised; other resume failures are recorded as
+        an "error" outcome and re-raised.
+        """
+        entry = self.approvals.pop(approval_id)
+        if entry is None:
+            return self.approvals.outcome(approval_id) or {"approval_id": approval_id, "status": "not_found"}
+        model = getattr(getattr(entry.runner.agent, "model", None), "model", None)
+        try:
+            # Same breaker/deadline path as every other model call, but a single attempt: resuming
+            # the confirmation twice could execute the trade twice.
+            chunks = await acall_with_retry(
+                f"gemini:{model}" if model else "gemini",
+                self._resume,
+                entry.runner,
+                entry.user_id,
+                entry.session_id,
+                entry.function_call_id,
+                entry.invocation_id,
+                approved,
+                policy=RESUME_POLICY,
+            )
+        except CircuitOpenError:
+            # Nothing was sent: the entry is still resumable, keep it parked for a later retry.
+            self.approvals.park(entry)
+            raise
+        except BaseException as e:
+            # The run may have progressed, so it is not safe to resume again; record the failure.
+            METRICS.inc("approvals_total", status="error")
+            self.approvals.record(entry, "error", approved=approved, error=repr(e))
+            raise
+        status = "approved" if approved else "rejected"
+        METRICS.inc("approvals_total", status=status)
+        # The resumed run carries the final plan; fall back to the pre-pause draft if it is silent.
+        text = "\n".join(chunks).strip() or entry.draft
+        return self.approvals.record(entry, status, trade_plan=_safe_json(text))
+
+    async def _run_idea(self, idea: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Steps 2-5 for a single idea, each stage timed as its own span.
+        """
+        idea_text = json.dumps(idea)
+
+        # Step 2: Data engineering
+        with span("data_engineering"):
+            prompt = f"Design pipeline for idea: {idea_text}. Emit pipeline_spec and dataset_ref JSON."
+            pipeline_raw = await self._routed("DataEngineeringAgent", lambda agent: _invoke(agent, prompt))
+        pipeline = _safe_json(pipeline_raw)
+
+        # Step 3: Analytics
+        with span("analytics"):
+            prompt = f"Analyze dataset_ref={json.dumps(pipeline)} for idea {idea_text}. Return JSON report."
+            analysis_raw = await self._routed("AnalyticsAgent", lambda agent: _invoke(agent, prompt))
+        analysis = _safe_json(analysis_raw)
+
+        # Step 4: Risk
+        with span("risk"):
+            prompt = f"trade_plan will come later. For now, assess risk using analysis={json.dumps(analysis)}, user_profile={json.dumps(profile)}."
+            risk_raw = await self._routed("RiskAgent", lambda agent: _invoke(agent, prompt))
+        risk = _safe_json(risk_raw)
+
+        # Step 5: Trading plan
+        auto_approve = os.getenv("AUTO_APPROVE_TRADES", "1").lower() not in {"0", "false", "no"}
+        meta = idea if isinstance(idea, dict) else {}
+        context = {"idea_id": meta.get("idea_id"), "symbol": meta.get("symbol")}
+        with span("trading"):
+            prompt = f"Idea: {idea_text}. RiskAssessment: {json.dumps(risk)}. User profile: {json.dumps(profile)}. Output TradePlan JSON; call propose_trade_execution to gate execution."
+            trade_raw = await self._routed(
+                "TradingAgent",
+                lambda agent: self._invoke_with_approval(agent, prompt, auto_approve=auto_approve, context=context),
+            )
+        trade_plan = _safe_json(trade_raw)
+
+        return {
+            "idea": idea,
+            "pipeline": pipeline,
+            "analysis": analysis,
+            "risk": risk,
+            "trade_plan": trade_plan,
+        }
+
     async def run_workflow(
         self,
         request: str,
@@ -134,74 +360,82 @@ class TradingOrchestrator:
         app_name: str = "web3-trading-copilot",
         user_id: str = "demo-user",
         session_id: str = "default-session",
+        time_budget_s: Optional[float] = None,
     ) -> Dict[str, Any]:
-        profile = user_profile or {"risk": "balanced", "notes": ""}
-        # Persist profile in session memory
-        await upsert_user_profile(app_name, user_id, session_id, profile)
-        profile = await get_user_profile(app_name, user_id, session_id)
-
-        # Step 1: Search for opportunities
-        ideas_raw = await _invoke(self.search_agent, f"User request: {request}. Return ideas JSON.")
-        ideas_resp = _safe_json(ideas_raw)
-        ideas: List[Dict[str, Any]] = ideas_resp.get("ideas", []) if isinstance(ideas_resp, dict) else []
-
-        results = []
-        for idea in ideas:
-            idea_text = json.dumps(idea)
-
-            # Step 2: Data engineering
-            pipeline_raw = await _invoke(
-                self.de_agent,
-                f"Design pipeline for idea: {idea_text}. Emit pipeline_spec and dataset_ref JSON.",
-            )
-            pipeline = _safe_json(pipeline_raw)
+        """
+        time_budget_s bounds the whole workflow (default: the router's workflow_budget_s);
+        as it runs out, stages are routed to the fastest model expected to fit.
 
-            # Step 3: Analytics
-            analysis_raw = await _invoke(
-                self.analytics_agent,
-                f"Analyze dataset_ref={json.dumps(pipeline)} for idea {idea_text}. Return JSON report.",
-            )
-            analysis = _safe_json(analysis_raw)
+        Running out of budget does not raise: the workflow returns status "partial" with the ideas
+        finished so far, the interrupted and unstarted ones marked "deadline_exceeded", and a
+        locally built report in place of the SummaryAgent's. Otherwise status is "complete".
+        """
+        time_budget_s = time_budget_s if time_budget_s is not None else self.router.workflow_budget_s
+        with span("workflow", kind="workflow", session_id=session_id) as record, budget(time_budget_s):
+            profile = user_profile or {"risk": "balanced", "notes": ""}
+            # Persist profile in session memory
+            await upsert_user_profile(app_name, user_id, session_id, profile)
+            profile = await get_user_profile(app_name, user_id, session_id)
 
-            # Step 4: Risk
-            risk_raw = await _invoke(
-                self.risk_agent,
-                f"trade_plan will come later. For now, assess risk using analysis={json.dumps(analysis)}, user_profile={json.dumps(profile)}.",
-            )
-            risk = _safe_json(risk_raw)
-
-            # Step 5: Trading plan
-            auto_approve = os.getenv("AUTO_APPROVE_TRADES", "1").lower() not in {"0", "false", "no"}
-            trade_raw = await self._invoke_with_approval(
-                self.trading_agent,
-                f"Idea: {idea_text}. RiskAssessment: {json.dumps(risk)}. User profile: {json.dumps(profile)}. Output TradePlan JSON; call propose_trade_execution to gate execution.",
-                auto_approve=auto_approve,
-            )
-            trade_plan = _safe_json(trade_raw)
-
-            results.append(
-                {
-                    "idea": idea,
-                    "pipeline": pipeline,
-                    "analysis": analysis,
-                    "risk": risk,
-                    "trade_plan": trade_plan,
-                }
-            )
+            # Step 1: Deterministic universe pre-screen, then one SearchAgent turn over the top-k
+            with span("screen"):
+                screen = await asyncio.to_thread(screen_universe, SCREENER_TOP_K)
+            deadline_hit = False
+            try:
+                with span("search"):
+                    prompt = f"User request: {request}. Pre-screened candidates: {json.dumps(screen)}. Return ideas JSON."
+                    ideas_raw = await self._routed("SearchAgent", lambda agent: _invoke(agent, prompt))
+            except DeadlineExceeded:
+                deadline_hit, ideas_raw = True, "{}"
+            ideas_resp = _safe_json(ideas_raw)
+            ideas: List[Dict[str, Any]] = ideas_resp.get("ideas", []) if isinstance(ideas_resp, dict) else []
+            record["attrs"]["num_ideas"] = len(ideas)
 
-        # Step 6: Final summary via Gemini
-        summary_agent = LlmAgent(
-            model=self.model,
-            name="SummaryAgent",
-            description="Summarize orchestrator results",
-            instruction="""
-            Create a concise markdown report from orchestrator outputs.
-            Include: ideas considered, key metrics, risk levels, trade plan highlights, cautions.
-            """,
-        )
-        summary_raw = await _invoke(summary_agent, json.dumps(results))
-        report_path = save_report(summary_raw, prefix="workflow")
-        return {"results": results, "report_path": report_path, "summary": summary_raw}
+            # Every symbol is known now: warm klines/depth/book ticker for all ideas in the
+            # background so later stages' tool calls overlap with the LLM latency of earlier ones.
+            symbols = [idea.get("symbol") if isinstance(idea, dict) else None for idea in ideas]
+            prefetch = start_prefetch(record["trace_id"], symbols)
+            results = []
+            try:
+                for idea, symbol in zip(ideas, symbols):
+                    if deadline_hit:
+                        results.append({"idea": idea, "status": "deadline_exceeded"})
+                        continue
+                    meta = idea if isinstance(idea, dict) else {}
+                    try:
+                        with span("idea", kind="idea", idea_id=meta.get("idea_id"), symbol=symbol):
+                            results.append(await self._run_idea(idea, profile))
+                    except DeadlineExceeded:
+                        deadline_hit = True
+                        results.append({"idea": idea, "status": "deadline_exceeded"})
+                    prefetch.done(symbol)
+            finally:
+                prefetch.close()
+
+            # Step 6: Final summary via Gemini (built locally if the budget is already spent)
+            if not deadline_hit:
+                try:
+                    with span("summary"):
+                        summary_raw = await self._routed("SummaryAgent", lambda agent: _invoke(agent, json.dumps(results)))
+                except DeadlineExceeded:
+                    deadline_hit = True
+            if deadline_hit:
+                record["attrs"]["deadline_exceeded"] = True
+                summary_raw = _partial_summary(request, results)
+            report_path = save_report(summary_raw, prefix="workflow")
+            pending = [
+                r["trade_plan"]
+                for r in results
+                if isinstance(r.get("trade_plan"), dict) and r["trade_plan"].get("status") == "pending_approval"
+            ]
+            return {
+                "status": "partial" if deadline_hit else "complete",
+                "results": results,
+                "report_path": report_path,
+                "summary": summary_raw,
+                "trace_id": record["trace_id"],
+                "pending_approvals": pending,
+            }
 
 
 async def main():
@@ -1,8 +1,10 @@
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
+from tools.backtest import backtest_trade_plans
 from tools.data_tools import fetch_binance_book_ticker, fetch_binance_depth
+from tools.risk_model import assess_portfolio_risk
 
 
 def create_risk_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
@@ -12,6 +14,7 @@ def create_risk_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
     model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
     return LlmAgent(
         model=model,
+        generate_content_config=model_call_config(),
         name="RiskAgent",
         description="Assesses risk levels and suggests mitigations for trade plans.",
         instruction="""
@@ -19,11 +22,15 @@ def create_risk_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
         Tools for liquidity/slippage checks:
         - fetch_binance_book_ticker (best bid/ask)
         - fetch_binance_depth (order book snapshot)
+        When a trade_plan (or candidate plans) is available, call backtest_trade_plans once with all
+        of them to see fills, stop/target hits, PnL and max adverse excursion on stored history.
+        Use assess_portfolio_risk (plans + holdings or address) for correlation-aware portfolio
+        VaR/CVaR and each plan's incremental VaR instead of judging the symbol in isolation.
         Produce RiskAssessment JSON with fields:
         - risk_level: one of [low, medium, high, reject]
         - reasons: list of concise bullets
         - adjustments: optional changes to sizing/entry/stop
         Be conservative for high drawdown or high volatility; reject if missing data or blatant risk.
         """,
-        tools=[fetch_binance_book_ticker, fetch_binance_depth],
+        tools=[fetch_binance_book_ticker, fetch_binance_depth, backtest_trade_plans, assess_portfolio_risk],
     )
@@ -0,0 +1,163 @@
+"""
+Latency-aware model routing per agent.
+
+Each agent is mapped to a tier (an ordered list of models) from config; a tier may name a
+fallback tier. The router keeps an EWMA of latency and error rate per model and, for every
+call, picks the first model in the agent's tier chain that is healthy. Unhealthy models get a
+probe request every PROBE_INTERVAL_S so they can recover. Inside a workflow time budget
+(tools.resilience.budget()), a model whose expected latency does not fit the remaining time is skipped in
+favour of the next one in the chain that does (or the fastest known one if none fits).
+
+Config (JSON, from MODEL_ROUTING_FILE or the MODEL_ROUTING env var), all keys optional:
+    {
+      "tiers": {"fast": ["gemini-2.5-flash-lite"], "reasoning": ["gemini-2.5-flash"]},
+      "fallback": {"reasoning": "fast"},
+      "agents": {"RiskAgent": "reasoning", "SummaryAgent": "fast"},
+      "default_tier": "fast",
+      "max_latency_s": 30, "max_error_rate": 0.5, "workflow_budget_s": 120
+    }
+Without config every tier is the orchestrator's model, so behaviour is unchanged.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from agents import DEFAULT_MODEL
+from tools.resilience import remaining_budget
+from tools.telemetry import METRICS, record_fallback
+
+EWMA_ALPHA = 0.2
+MIN_SAMPLES = 3
+PROBE_INTERVAL_S = 60.0
+DEFAULT_MAX_LATENCY_S = 30.0
+DEFAULT_MAX_ERROR_RATE = 0.5
+
+# JSON-shaping stages go to the fast tier; the reasoning-heavy ones to "reasoning".
+DEFAULT_AGENT_TIERS = {
+    "SearchAgent": "fast",
+    "DataEngineeringAgent": "fast",
+    "SummaryAgent": "fast",
+    "AnalyticsAgent": "reasoning",
+    "RiskAgent": "reasoning",
+    "TradingAgent": "reasoning",
+}
+
+
+class ModelStats:
+    __slots__ = ("latency_s", "error_rate", "samples", "last_used")
+
+    def __init__(self):
+        self.latency_s = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_used = 0.0
+
+    def update(self, latency_s: float, ok: bool) -> None:
+        if self.samples == 0:
+            self.latency_s, self.error_rate = latency_s, 0.0 if ok else 1.0
+        else:
+            self.latency_s += EWMA_ALPHA * (latency_s - self.latency_s)
+            self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        self.samples += 1
+
+
+class ModelRouter:
+    """
+    Picks a model per agent call from its tier chain using observed latency/error rates.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, default_model: str = DEFAULT_MODEL):
+        config = config or {}
+        self.tiers: Dict[str, List[str]] = {"fast": [default_model], "reasoning": [default_model]}
+        self.tiers.update({name: list(models) for name, models in config.get("tiers", {}).items()})
+        self.fallback: Dict[str, str] = dict(config.get("fallback", {"reasoning": "fast"}))
+        self.agent_tiers = {**DEFAULT_AGENT_TIERS, **config.get("agents", {})}
+        self.default_tier = config.get("default_tier", "fast")
+        self.max_latency_s = float(config.get("max_latency_s", DEFAULT_MAX_LATENCY_S))
+        self.max_error_rate = float(config.get("max_error_rate", DEFAULT_MAX_ERROR_RATE))
+        self.workflow_budget_s = config.get("workflow_budget_s")
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_model: str = DEFAULT_MODEL) -> "ModelRouter":
+        path = os.getenv("MODEL_ROUTING_FILE")
+        raw = os.getenv("MODEL_ROUTING")
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        else:
+            config = json.loads(raw) if raw else {}
+        if os.getenv("WORKFLOW_BUDGET_S"):
+            config["workflow_budget_s"] = float(os.environ["WORKFLOW_BUDGET_S"])
+        return cls(config, default_model=default_model)
+
+    def chain(self, agent_name: str) -> List[str]:
+        """
+        Candidate models for an agent: its tier, then each fallback tier, without duplicates.
+        """
+        models: List[str] = []
+        tier: Optional[str] = self.agent_tiers.get(agent_name, self.default_tier)
+        seen: Set[str] = set()
+        while tier and tier not in seen:
+            seen.add(tier)
+            models.extend(m for m in self.tiers.get(tier, []) if m not in models)
+            tier = self.fallback.get(tier)
+        return models
+
+    def primary(self, agent_name: str) -> str:
+        return self.chain(agent_name)[0]
+
+    def _healthy(self, stats: Optional[ModelStats], now: float) -> bool:
+        if stats is None or stats.samples < MIN_SAMPLES:
+            return True
+        if stats.error_rate <= self.max_error_rate and stats.latency_s <= self.max_latency_s:
+            return True
+        # Let one probe through periodically so a recovered model can win back traffic.
+        return now - stats.last_used >= PROBE_INTERVAL_S
+
+    def select(self, agent_name: str, exclude: Optional[Set[str]] = None) -> Optional[str]:
+        """
+        Model for the next call of agent_name (None if every candidate is excluded).
+        """
+        candidates = [m for m in self.chain(agent_name) if m not in (exclude or set())]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            stats = {m: self._stats.get(m) for m in candidates}
+            healthy = [m for m in candidates if self._healthy(stats[m], now)]
+            choice = healthy[0] if healthy else min(candidates, key=lambda m: stats[m].error_rate)
+            reason = None if choice == candidates[0] else "unhealthy"
+
+            left = remaining_budget()
+            expected = stats[choice].latency_s if stats[choice] and stats[choice].samples else 0.0
+            if left is not None and expected > left:
+                known = [m for m in (healthy or candidates) if stats[m] and stats[m].samples]
+                fits = [m for m in known if stats[m].latency_s <= left]
+                # Highest-preference model that fits; if none does, the fastest one.
+                pick = fits[0] if fits else min(known, key=lambda m: stats[m].latency_s)
+                if pick != choice:
+                    choice, reason = pick, "budget"
+            if choice in self._stats:
+                self._stats[choice].last_used = now
+        if reason:
+            record_fallback(f"model:{agent_name}", reason=reason)
+        return choice
+
+    def record(self, model: str, latency_s: float, ok: bool, agent_name: str = "") -> None:
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.update(latency_s, ok)
+            stats.last_used = time.monotonic()
+        METRICS.observe("model_latency_seconds", latency_s, model=model)
+        METRICS.inc("model_calls_total", model=model, agent=agent_name, status="ok" if ok else "error")
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                m: {"latency_s": round(s.latency_s, 3), "error_rate": round(s.error_rate, 3), "samples": s.samples}
+                for m, s in self._stats.items()
+            }
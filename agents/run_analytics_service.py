@@ -2,11 +2,12 @@ import uvicorn
 from google.adk.a2a.utils.agent_to_a2a import to_a2a
 
 from agents.analytics_agent import create_analytics_agent
+from tools.telemetry import mount_metrics
 
 
 def main():
     agent = create_analytics_agent()
-    app = to_a2a(agent)
+    app = mount_metrics(to_a2a(agent))
     uvicorn.run(app, host="0.0.0.0", port=8013)
 
 
@@ -2,11 +2,12 @@ import uvicorn
 from google.adk.a2a.utils.agent_to_a2a import to_a2a
 
 from agents.data_engineering_agent import create_data_engineering_agent
+from tools.telemetry import mount_metrics
 
 
 def main():
     agent = create_data_engineering_agent()
-    app = to_a2a(agent)
+    app = mount_metrics(to_a2a(agent))
     uvicorn.run(app, host="0.0.0.0", port=8012)
 
 
@@ -1,6 +1,8 @@
 import argparse
 import asyncio
+import json
 import os
+import sys
 
 from agents.orchestrator import TradingOrchestrator
 
@@ -20,6 +22,15 @@ async def main():
     print("Summary:\n", resp["summary"])
     print("Report saved to:", resp["report_path"])
 
+    # Trades parked for approval (AUTO_APPROVE_TRADES=0) can be resolved here or via resolve_approval().
+    for pending in resp.get("pending_approvals", []):
+        if not sys.stdin.isatty():
+            print("Pending approval:", pending["approval_id"], pending.get("symbol"))
+            continue
+        answer = input(f"Approve trade for {pending.get('symbol')} ({pending['approval_id']})? [y/N] ")
+        result = await orchestrator.resolve_approval(pending["approval_id"], answer.strip().lower() in {"y", "yes"})
+        print(json.dumps(result, indent=2, default=str))
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -3,8 +3,10 @@ from typing import List
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
 from tools.data_tools import load_prices, fetch_binance_spot_klines, fetch_binance_24h
+from tools.indicators import get_technical_indicators
+from tools.screener import screen_universe
 
 
 def create_search_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
@@ -15,18 +17,25 @@ def create_search_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
     model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
     return LlmAgent(
         model=model,
+        generate_content_config=model_call_config(),
         name="SearchAgent",
         description="Find candidate trading opportunities from local price stats.",
         instruction="""
         You surface 3-5 candidate trading ideas based on simple heuristics
-        (recent returns, volatility, volume). Prefer live Binance spot data when available:
-        - fetch_binance_spot_klines for OHLCV
-        - fetch_binance_24h for 24h change/volume
+        (recent returns, volatility, volume). The request usually includes "Pre-screened candidates":
+        the top-k symbols of the whole exchange already scored on 24h return, range, volume and
+        spread. Pick ideas from those stats directly; only call tools when the user names symbols
+        that are not in the list or the list is missing:
+        - screen_universe for the ranked top-k (one call covers the whole exchange)
+        - get_technical_indicators(symbols=[...], interval="1d") for RSI/MACD/ATR/Bollinger/VWAP
+          signals of several shortlisted symbols in one call, instead of reading raw klines
+        - fetch_binance_spot_klines for OHLCV of a specific symbol
+        - fetch_binance_24h for 24h change/volume of a specific symbol
         If live is disabled, fall back to load_prices sample data.
 
         Suggest symbols with a short rationale and a 'idea_id'.
 
         Output JSON with: ideas=[{idea_id, symbol, rationale, suggested_window_days}]
         """,
-        tools=[fetch_binance_spot_klines, fetch_binance_24h, load_prices],
+        tools=[screen_universe, get_technical_indicators, fetch_binance_spot_klines, fetch_binance_24h, load_prices],
     )
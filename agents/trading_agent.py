@@ -2,7 +2,8 @@ from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 from google.adk.tools.function_tool import FunctionTool
 
-from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents import DEFAULT_MODEL, DEFAULT_RETRY, model_call_config
+from tools.backtest import backtest_trade_plans
 from tools.trading_tools import propose_trade_execution
 
 
@@ -13,6 +14,7 @@ def create_trading_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
     model = Gemini(model=model_name, retry_options=DEFAULT_RETRY)
     return LlmAgent(
         model=model,
+        generate_content_config=model_call_config(),
         name="TradingAgent",
         description="Proposes paper trade plans (no live execution).",
         instruction="""
@@ -27,11 +29,13 @@ def create_trading_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
           "time_horizon_days": int,
           "notes": "short text"
         }
+        Optionally sanity-check candidate plans first with one backtest_trade_plans call (pass all
+        variants together) and prefer the plan with better PnL / lower max adverse excursion.
         Then call propose_trade_execution to gate execution:
           - if status is pending, inform user we await approval
           - if approved/auto-approved/rejected, summarize outcome
         Respect user risk: reduce size for conservative profiles, tighten stops for high risk.
         Do NOT claim to execute trades; this is paper planning only.
         """,
-        tools=[FunctionTool(func=propose_trade_execution)],
+        tools=[FunctionTool(func=propose_trade_execution), backtest_trade_plans],
     )
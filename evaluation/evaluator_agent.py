@@ -1,9 +1,15 @@
+import asyncio
+import json
 from typing import Dict
 
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
 
 from agents import DEFAULT_MODEL, DEFAULT_RETRY
+from agents.orchestrator import _invoke
+
+# Bump when the evaluator prompt/model changes so cached scores are recomputed.
+EVALUATOR_VERSION = "2"
 
 
 def create_evaluator_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
@@ -28,15 +34,30 @@ def create_evaluator_agent(model_name: str = DEFAULT_MODEL) -> LlmAgent:
 
 
 def evaluate_report(agent: LlmAgent, user_request: str, report: str) -> Dict:
+    """
+    Blocking convenience wrapper; prefer evaluate_report_async inside an event loop.
+    """
+    return asyncio.run(evaluate_report_async(agent, user_request, report))
+
+
+async def evaluate_report_async(agent: LlmAgent, user_request: str, report: str) -> Dict:
+    """
+    Score a report without blocking the event loop. Returns parsed scores plus the raw text.
+    """
     prompt = f"User request: {user_request}\nReport:\n{report}\nReturn JSON only."
-    resp = agent.run(prompt)
-    # Attempt to extract text parts
-    if isinstance(resp, str):
-        return {"raw": resp}
-    text_parts = []
-    for event in resp or []:
-        if getattr(event, "content", None) and event.content.parts:
-            for part in event.content.parts:
-                if getattr(part, "text", None):
-                    text_parts.append(part.text)
-    return {"raw": "\n".join(text_parts)}
+    raw = await _invoke(agent, prompt)
+    return {**parse_scores(raw), "raw": raw}
+
+
+def parse_scores(raw: str) -> Dict:
+    """
+    Extract the score JSON from evaluator text (tolerates ```json fences and surrounding prose).
+    """
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        parsed = json.loads(raw[start : end + 1])
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
@@ -1,40 +1,197 @@
 """
-Run a couple of canned scenarios end-to-end and score them with EvaluatorAgent.
+Run canned (or file-provided) scenarios end-to-end and score them with EvaluatorAgent.
+
+Scenarios run concurrently (bounded by --concurrency) on one shared TradingOrchestrator.
+Scores are cached by (report hash, evaluator version) so unchanged reports are not re-scored,
+and results are written as a JSONL + CSV table with per-stage timings.
 """
+import argparse
 import asyncio
+import csv
+import hashlib
+import json
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
+from agents import DEFAULT_MODEL
 from agents.orchestrator import TradingOrchestrator
-from evaluation.evaluator_agent import create_evaluator_agent, evaluate_report
+from evaluation.evaluator_agent import EVALUATOR_VERSION, create_evaluator_agent, evaluate_report_async
+from tools.telemetry import record_cache, span
+
+EVAL_DIR = Path(__file__).resolve().parent
+DEFAULT_SCENARIOS = [
+    {"request": "Analyze ETHUSD for conservative user; flag risks and propose small-size trades.", "risk": "conservative"},
+    {"request": "Analyze SOLUSD and DOGEUSD with aggressive risk; highlight volatility and sizing.", "risk": "aggressive"},
+]
+SCORE_FIELDS = ("completeness_score", "risk_score", "alignment_score")
+RESULT_FIELDS = [
+    "scenario_id",
+    "request",
+    "risk",
+    "status",
+    "completeness_score",
+    "risk_score",
+    "alignment_score",
+    "score_cached",
+    "workflow_s",
+    "eval_s",
+    "total_s",
+    "report_path",
+    "trace_id",
+    "error",
+]
+
+
+def is_complete(score: Any) -> bool:
+    return isinstance(score, dict) and all(score.get(field) is not None for field in SCORE_FIELDS)
+
+
+class ScoreCache:
+    """
+    Append-only JSONL cache of evaluator scores keyed by (report hash, evaluator version).
+    """
+
+    def __init__(self, path: Path, version: str):
+        self.path = path
+        self.version = version
+        self._scores: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        if path.exists():
+            for line in path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if is_complete(entry.get("score")):
+                    self._scores[entry["key"]] = entry["score"]
+
+    def key(self, request: str, report: str) -> str:
+        digest = hashlib.sha256(f"{request}\0{report}".encode("utf-8")).hexdigest()
+        return f"{digest}:{self.version}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        score = self._scores.get(key)
+        record_cache("eval_scores", score is not None)
+        return score
 
+    async def put(self, key: str, score: Dict[str, Any]) -> None:
+        """
+        Cache a score; incomplete ones (unparseable evaluator replies) are dropped so they get re-scored.
+        """
+        if not is_complete(score):
+            return
+        async with self._lock:
+            self._scores[key] = score
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as fh:
+                fh.write(json.dumps({"key": key, "score": score}) + "\n")
 
-async def run_scenario(request: str):
-    orchestrator = TradingOrchestrator()
-    result = await orchestrator.run_workflow(request, user_profile={"risk": "balanced"})
-    evaluator = create_evaluator_agent()
-    score = evaluate_report(evaluator, request, result["summary"])
-    return {"request": request, "score": score, "report_path": result["report_path"]}
+
+def load_scenarios(path: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Read scenarios from a JSONL file ({"request": ..., "risk": ...} per line) or use the defaults.
+    """
+    if not path:
+        return list(DEFAULT_SCENARIOS)
+    scenarios = []
+    for line in Path(path).read_text().splitlines():
+        if line.strip():
+            scenarios.append(json.loads(line))
+    return scenarios
+
+
+async def run_scenario(
+    scenario_id: int,
+    scenario: Dict[str, Any],
+    orchestrator: TradingOrchestrator,
+    evaluator,
+    cache: ScoreCache,
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    request = scenario["request"]
+    risk = scenario.get("risk", "balanced")
+    row: Dict[str, Any] = {"scenario_id": scenario_id, "request": request, "risk": risk, "status": "ok", "score_cached": False}
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            with span("evaluation", kind="workflow", scenario_id=scenario_id):
+                # Distinct session ids keep concurrent scenarios from sharing a user profile.
+                result = await orchestrator.run_workflow(
+                    request, user_profile={"risk": risk}, session_id=f"eval-{scenario_id}"
+                )
+                row["workflow_s"] = round(time.perf_counter() - started, 3)
+                row["report_path"] = result["report_path"]
+                row["trace_id"] = result.get("trace_id")
+                if result.get("status") == "partial":
+                    # Out of time budget: some ideas were not analyzed, so don't count it as complete.
+                    row["status"] = "partial"
+
+                eval_started = time.perf_counter()
+                key = cache.key(request, result["summary"])
+                score = cache.get(key)
+                if score is None:
+                    score = await evaluate_report_async(evaluator, request, result["summary"])
+                    await cache.put(key, score)
+                else:
+                    row["score_cached"] = True
+                row["eval_s"] = round(time.perf_counter() - eval_started, 3)
+                for field in SCORE_FIELDS:
+                    row[field] = score.get(field)
+                if not is_complete(score):
+                    row["status"] = "error"
+                    missing = [field for field in SCORE_FIELDS if score.get(field) is None]
+                    row["error"] = f"evaluator reply missing {', '.join(missing)}"
+        except Exception as e:
+            row["status"] = "error"
+            row["error"] = repr(e)
+        row["total_s"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def write_results(rows: List[Dict[str, Any]], out_prefix: Path) -> None:
+    out_prefix.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_prefix.with_suffix(".jsonl"), "w") as fh:
+        for row in rows:
+            fh.write(json.dumps(row) + "\n")
+    with open(out_prefix.with_suffix(".csv"), "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+async def run_all(
+    scenarios: List[Dict[str, Any]],
+    concurrency: int = 4,
+    cache_path: Path = EVAL_DIR / "score_cache.jsonl",
+    model_name: str = DEFAULT_MODEL,
+) -> List[Dict[str, Any]]:
+    orchestrator = TradingOrchestrator(model_name)
+    evaluator = create_evaluator_agent(model_name)
+    cache = ScoreCache(cache_path, version=f"{EVALUATOR_VERSION}:{model_name}")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [run_scenario(i, s, orchestrator, evaluator, cache, semaphore) for i, s in enumerate(scenarios)]
+    return await asyncio.gather(*tasks)
 
 
 async def main():
-    scenarios = [
-        "Analyze ETHUSD for conservative user; flag risks and propose small-size trades.",
-        "Analyze SOLUSD and DOGEUSD with aggressive risk; highlight volatility and sizing.",
-    ]
-    outputs = []
-    for s in scenarios:
-        out = await run_scenario(s)
-        outputs.append(out)
-        print(f"Scenario: {s}")
-        print("Score:", out["score"])
-        print("Report:", out["report_path"])
-        print("-" * 40)
-
-    # Save summary artifact
-    summary_path = Path("evaluation") / "eval_results.txt"
-    lines = [f"{o['request']} -> {o['score']}" for o in outputs]
-    summary_path.write_text("\n".join(lines))
-    print("Saved eval summary to", summary_path)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=str, default=None, help="JSONL file of {request, risk} scenarios")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max scenarios in flight")
+    parser.add_argument("--out", type=str, default=str(EVAL_DIR / "eval_results"), help="Output prefix (.jsonl/.csv)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = await run_all(load_scenarios(args.scenarios), concurrency=args.concurrency)
+    for row in rows:
+        print(
+            f"[{row['status']}] {row['request'][:60]} -> completeness={row.get('completeness_score')} "
+            f"risk={row.get('risk_score')} alignment={row.get('alignment_score')} "
+            f"cached={row['score_cached']} total={row['total_s']}s"
+        )
+    out_prefix = Path(args.out)
+    write_results(rows, out_prefix)
+    print(f"Saved {len(rows)} results to {out_prefix}.jsonl/.csv in {time.perf_counter() - started:.1f}s")
 
 
 if __name__ == "__main__":
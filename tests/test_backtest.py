@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from tools.backtest import run_backtest
+
+
+def _bars(rows):
+    return pd.DataFrame(
+        rows, columns=["timestamp", "open", "high", "low", "close"]
+    ).assign(timestamp=lambda df: pd.to_datetime(df["timestamp"]))
+
+
+def test_fill_bar_gapping_through_stop_exits_at_fill_price():
+    bars = _bars(
+        [
+            ("2025-01-01", 102, 103, 101, 102),
+            ("2025-01-02", 90, 91, 88, 89),
+            ("2025-01-03", 89, 92, 87, 90),
+        ]
+    )
+    plan = {"symbol": "ETHUSDT", "side": "buy", "entry": 100, "stop_loss": 95, "time_horizon_days": 2}
+    result = run_backtest([plan], {"ETHUSDT": bars}, start="2025-01-01").iloc[0]
+    assert result["fill_price"] == 90
+    assert result["exit_reason"] == "stop_loss"
+    assert result["exit_price"] == 90
+    assert result["pnl_pct"] == pytest.approx(0.0)
+
+
+def test_sell_fill_bar_gapping_through_stop_exits_at_fill_price():
+    bars = _bars(
+        [
+            ("2025-01-01", 98, 99, 97, 98),
+            ("2025-01-02", 110, 112, 109, 111),
+        ]
+    )
+    plan = {"symbol": "ETHUSDT", "side": "sell", "entry": 100, "stop_loss": 105, "time_horizon_days": 1}
+    result = run_backtest([plan], {"ETHUSDT": bars}, start="2025-01-01").iloc[0]
+    assert result["fill_price"] == 110
+    assert result["exit_reason"] == "stop_loss"
+    assert result["exit_price"] == 110
+
+
+def test_malformed_plan_fields_are_marked_invalid_not_raised():
+    bars = _bars([(f"2025-01-0{d}", 100, 101, 99, 100) for d in range(1, 8)])
+    plans = [
+        {"symbol": "ETHUSDT", "start": "2025-01-02"},
+        {"symbol": "ETHUSDT", "start": "2025-01-03T00:00:00Z", "time_horizon_days": "2 days"},
+        {"symbol": "ETHUSDT"},
+        {"symbol": "ETHUSDT", "start": "tomorrow"},
+        {"symbol": "ETHUSDT", "entry": ["a", "b"]},
+    ]
+    results = run_backtest(plans, {"ETHUSDT": bars})
+    assert list(results["exit_reason"][:3]) == ["time_exit"] * 3
+    assert list(results["exit_reason"][3:]) == ["invalid", "invalid"]
+    assert results["fill_time"][1] == pd.Timestamp("2025-01-03")
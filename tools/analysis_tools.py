@@ -3,6 +3,9 @@ from typing import Dict, Optional
 
 import pandas as pd
 
+from tools.positions import mark_positions, match_lots
+from tools.telemetry import traced_tool
+
 
 @dataclass
 class AnalysisResult:
@@ -10,6 +13,7 @@ class AnalysisResult:
     notes: str
 
 
+@traced_tool
 def compute_basic_metrics(prices: pd.DataFrame) -> AnalysisResult:
     """
     Compute simple performance metrics on OHLCV data.
@@ -37,6 +41,7 @@ def compute_basic_metrics(prices: pd.DataFrame) -> AnalysisResult:
     return {"metrics": metrics, "notes": "Computed on local sample OHLCV data."}
 
 
+@traced_tool
 def compute_trade_stats(trades: pd.DataFrame) -> AnalysisResult:
     """
     Compute simple trade stats for a given address or portfolio.
@@ -49,13 +54,19 @@ def compute_trade_stats(trades: pd.DataFrame) -> AnalysisResult:
     buys = trades[trades["side"].str.lower() == "buy"]
     sells = trades[trades["side"].str.lower() == "sell"]
 
+    positions = mark_positions(match_lots(trades, method="fifo")["state"])
+    unrealized = positions["unrealized_pnl"].sum(min_count=1)
+
     metrics = {
         "num_trades": len(trades),
         "num_buys": len(buys),
         "num_sells": len(sells),
         "symbols_traded": trades["symbol"].nunique(),
+        "realized_pnl": round(float(positions["realized_pnl"].sum()), 4),
+        "unrealized_pnl": round(float(unrealized), 4) if pd.notna(unrealized) else None,
+        "open_positions": int((positions["quantity"] > 0).sum()),
     }
-    return {"metrics": metrics, "notes": "Basic trade stats; no PnL since we use mock data."}
+    return {"metrics": metrics, "notes": "FIFO realized PnL; unrealized PnL marked to the latest kline close."}
 
 
 def _max_drawdown(series: pd.Series) -> float:
@@ -0,0 +1,326 @@
+"""
+Vectorized backtest for TradingAgent TradePlans against OHLCV history (Binance spot klines,
+falling back to the local price CSV).
+
+Plans are grouped by symbol; within a symbol every plan's horizon is laid out as a row of a
+(plans x bars) matrix, so fills, stop/take-profit hits and adverse excursions are found with
+array ops instead of a per-bar loop.
+
+Fill/exit rules (kept deliberately simple and conservative):
+- entry is a limit price (or "low-high" range); a buy fills on the first bar whose low reaches it,
+  at min(open, entry). Missing/"market" entry fills at the first bar's open. Sells mirror this.
+- stop_loss/take_profit are levels or percentages ("5%") from the fill price.
+- exits are checked from the fill bar on; if stop and target both trade in one bar, the stop wins.
+  Gaps through a level exit at the bar open (at the fill price on the fill bar itself).
+  Anything still open at the horizon exits at the last close.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.resample import interval_ms
+from tools.telemetry import traced_tool
+
+DEFAULT_HORIZON_DAYS = 7
+# 1000 hourly candles (Binance's per-request maximum) cover ~41 days of plan horizons.
+HISTORY_INTERVAL = "1h"
+HISTORY_LIMIT = 1000
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_UNSET = {"", "none", "null", "n/a", "na"}
+_MARKET = {"market", "mkt", "now"}
+
+
+def _parse_level(value: Any) -> Tuple[float, float, bool]:
+    """
+    Return (low, high, is_percent) for a number, "3400-3500" range, [lo, hi] list or "5%".
+    NaNs mean "not set" or unparseable (see _is_unparsed).
+    """
+    if value is None or (isinstance(value, str) and value.strip().lower() in _UNSET):
+        return np.nan, np.nan, False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), float(value), False
+    if isinstance(value, (list, tuple)):
+        parsed = [_parse_level(v) for v in value]
+        nums = [n for lo, hi, _ in parsed for n in (lo, hi) if not np.isnan(n)]
+        if not nums or len(nums) < 2 * len(parsed):
+            return np.nan, np.nan, False
+        return min(nums), max(nums), any(pct for _, _, pct in parsed)
+    text = str(value).replace(",", "").strip()
+    is_pct = text.endswith("%")
+    # Split ranges on "-" only between numbers so "-5%" stays a single value.
+    nums = [float(n) for n in _NUMBER.findall(re.sub(r"(?<=\d)\s*-\s*(?=\d)", " ", text))]
+    if not nums:
+        return np.nan, np.nan, False
+    nums = [abs(n) for n in nums]
+    return min(nums), max(nums), is_pct
+
+
+def _is_unparsed(value: Any, parsed: float) -> bool:
+    """True if a level was given but could not be read (as opposed to not set)."""
+    if not np.isnan(parsed) or value is None:
+        return False
+    return not (isinstance(value, str) and value.strip().lower() in _UNSET)
+
+
+def _parse_number(value: Any, default: float) -> float:
+    """
+    A single number from LLM-shaped input ("5%", "7 days", 3); default when unset or unparseable.
+    """
+    low, _, _ = _parse_level(value)
+    return default if np.isnan(low) else low
+
+
+def _parse_starts(values: List[Any]) -> pd.Series:
+    """
+    Naive-UTC timestamps from mixed input (naive, "Z"/offset-suffixed, Timestamp, missing);
+    anything unparseable becomes NaT.
+    """
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors="coerce", format="mixed")
+    return parsed.dt.tz_localize(None)
+
+
+def _plan_arrays(plans: List[Dict[str, Any]], default_start: Any = None) -> pd.DataFrame:
+    """
+    One row per plan. Plans with a level or start that was given but cannot be parsed get an
+    "invalid" reason instead of raising, so one malformed plan does not sink the batch.
+    """
+    rows, raw_starts = [], []
+    for i, plan in enumerate(plans):
+        plan = plan if isinstance(plan, dict) else {}
+        side = str(plan.get("side", "buy")).lower()
+        invalid = []
+        entry = plan.get("entry")
+        entry_lo, entry_hi, _ = _parse_level(entry)
+        if _is_unparsed(entry, entry_lo) and not any(word in str(entry).lower() for word in _MARKET):
+            invalid.append("entry")
+        stop, _, stop_pct = _parse_level(plan.get("stop_loss"))
+        if _is_unparsed(plan.get("stop_loss"), stop):
+            invalid.append("stop_loss")
+        take, _, take_pct = _parse_level(plan.get("take_profit"))
+        if _is_unparsed(plan.get("take_profit"), take):
+            invalid.append("take_profit")
+        raw_starts.append(plan.get("start") or plan.get("created_at") or None)
+        rows.append(
+            {
+                "plan_index": i,
+                "symbol": str(plan.get("symbol", "")).upper(),
+                "direction": -1.0 if side in {"sell", "short"} else 1.0,
+                "size_pct": _parse_number(plan.get("size_pct"), 0.0),
+                "entry_lo": entry_lo,
+                "entry_hi": entry_hi,
+                "stop": stop,
+                "stop_pct": stop_pct,
+                "take": take,
+                "take_pct": take_pct,
+                "horizon_days": _parse_number(plan.get("time_horizon_days"), DEFAULT_HORIZON_DAYS) or DEFAULT_HORIZON_DAYS,
+                "invalid": ", ".join(invalid),
+            }
+        )
+    if not rows:
+        return pd.DataFrame()
+    out = pd.DataFrame(rows)
+    starts = _parse_starts(raw_starts)
+    # A start that was given but is unreadable would silently backtest another window.
+    bad_start = starts.isna().to_numpy() & pd.Series(raw_starts, dtype=object).notna().to_numpy()
+    out.loc[bad_start, "invalid"] = out.loc[bad_start, "invalid"].map(lambda r: ", ".join(filter(None, [r, "start"])))
+    default = _parse_starts([default_start]).iloc[0]
+    out["start"] = starts.fillna(default) if pd.notna(default) else starts
+    return out
+
+
+def _no_data(plans: pd.DataFrame, reason: str = "no_data") -> pd.DataFrame:
+    out = pd.DataFrame(
+        {
+            "plan_index": plans["plan_index"].to_numpy(),
+            "symbol": plans["symbol"].to_numpy(),
+            "side": np.where(plans["direction"].to_numpy() > 0, "buy", "sell"),
+            "filled": False,
+            "exit_reason": reason,
+            "bars_held": 0,
+        }
+    )
+    if reason == "invalid":
+        out["error"] = ("unparseable " + plans["invalid"]).to_numpy()
+    return out
+
+
+def simulate_symbol(bars: pd.DataFrame, plans: pd.DataFrame) -> pd.DataFrame:
+    """
+    Simulate all plans for one symbol. bars: timestamp/open/high/low/close sorted by time.
+    plans: output of _plan_arrays for that symbol. Returns one result row per plan.
+    """
+    if bars.empty:
+        return _no_data(plans)
+    ts = bars["timestamp"].to_numpy(dtype="datetime64[ns]")
+    o, h, l, c = (bars[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close"))
+    n_bars, n_plans = len(ts), len(plans)
+    direction = plans["direction"].to_numpy()
+    is_buy = direction > 0
+
+    # Default start: early enough that the horizon fits inside the available history.
+    horizon = pd.to_timedelta(plans["horizon_days"].to_numpy(), unit="D").to_numpy()
+    start = plans["start"].to_numpy(dtype="datetime64[ns]")
+    start = np.where(np.isnat(start), ts[-1] - horizon, start)
+    start_idx = np.searchsorted(ts, start, side="left")
+    end_idx = np.searchsorted(ts, start + horizon, side="right")  # exclusive
+    width = int(max((end_idx - start_idx).max(initial=0), 1))
+
+    offsets = np.arange(width)
+    idx = start_idx[:, None] + offsets[None, :]
+    valid = idx < end_idx[:, None]
+    idx = np.minimum(idx, n_bars - 1)
+    O, H, L, C = o[idx], h[idx], l[idx], c[idx]
+
+    # Entry: limit at the favourable edge of the range; NaN entry means market at first open.
+    limit = np.where(is_buy, plans["entry_hi"].to_numpy(), plans["entry_lo"].to_numpy())
+    market = np.isnan(limit)
+    touched = np.where(is_buy[:, None], L <= limit[:, None], H >= limit[:, None]) | market[:, None]
+    touched &= valid
+    filled = touched.any(axis=1)
+    fill_k = np.where(filled, touched.argmax(axis=1), 0)
+    rows = np.arange(n_plans)
+    fill_open = O[rows, fill_k]
+    fill_px = np.where(
+        market, fill_open, np.where(is_buy, np.minimum(fill_open, limit), np.maximum(fill_open, limit))
+    )
+
+    # Resolve percentage stops/targets against the actual fill price.
+    stop = plans["stop"].to_numpy()
+    take = plans["take"].to_numpy()
+    stop = np.where(plans["stop_pct"].to_numpy(), fill_px * (1 - direction * stop / 100), stop)
+    take = np.where(plans["take_pct"].to_numpy(), fill_px * (1 + direction * take / 100), take)
+
+    live = valid & (offsets[None, :] >= fill_k[:, None]) & filled[:, None]
+    stop_hit = np.where(is_buy[:, None], L <= stop[:, None], H >= stop[:, None]) & live & ~np.isnan(stop)[:, None]
+    take_hit = np.where(is_buy[:, None], H >= take[:, None], L <= take[:, None]) & live & ~np.isnan(take)[:, None]
+    any_stop, any_take = stop_hit.any(axis=1), take_hit.any(axis=1)
+    stop_k = np.where(any_stop, stop_hit.argmax(axis=1), width)
+    take_k = np.where(any_take, take_hit.argmax(axis=1), width)
+    last_k = np.maximum(end_idx - start_idx - 1, 0)
+    exit_k = np.minimum(np.minimum(stop_k, take_k), last_k)
+
+    by_stop = any_stop & (stop_k <= take_k) & (stop_k <= last_k)
+    by_take = any_take & (take_k < stop_k) & (take_k <= last_k)
+    # A level gapped through exits at the bar open; on the fill bar the position only exists
+    # from the fill price on, so that price plays the role of the open (a fill below the stop
+    # is an immediate stop-out at the fill, not an exit at the higher stop level).
+    ref_px = np.where(exit_k > fill_k, O[rows, exit_k], fill_px)
+    stop_px = np.where(is_buy, np.minimum(ref_px, stop), np.maximum(ref_px, stop))
+    take_px = np.where(is_buy, np.maximum(ref_px, take), np.minimum(ref_px, take))
+    exit_px = np.where(by_stop, stop_px, np.where(by_take, take_px, C[rows, exit_k]))
+
+    # Max adverse excursion between fill and exit (inclusive).
+    held = live & (offsets[None, :] <= exit_k[:, None])
+    worst_low = np.where(held, L, np.inf).min(axis=1)
+    worst_high = np.where(held, H, -np.inf).max(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mae = np.where(is_buy, (fill_px - worst_low) / fill_px, (worst_high - fill_px) / fill_px)
+        pnl = direction * (exit_px - fill_px) / fill_px
+
+    has_data = end_idx > start_idx
+    reason = np.select(
+        [~has_data, ~filled, by_stop, by_take],
+        ["no_data", "not_filled", "stop_loss", "take_profit"],
+        default="time_exit",
+    )
+    done = filled & has_data
+    nat = np.datetime64("NaT", "ns")
+    fill_time = np.where(done, ts[np.minimum(start_idx + fill_k, n_bars - 1)], nat)
+    exit_time = np.where(done, ts[np.minimum(start_idx + exit_k, n_bars - 1)], nat)
+    return pd.DataFrame(
+        {
+            "plan_index": plans["plan_index"].to_numpy(),
+            "symbol": plans["symbol"].to_numpy(),
+            "side": np.where(is_buy, "buy", "sell"),
+            "filled": done,
+            "fill_time": fill_time,
+            "fill_price": np.where(done, fill_px, np.nan),
+            "exit_time": exit_time,
+            "exit_price": np.where(done, exit_px, np.nan),
+            "exit_reason": reason,
+            "bars_held": np.where(done, exit_k - fill_k + 1, 0),
+            "pnl_pct": np.where(done, np.round(pnl * 100, 4), np.nan),
+            "weighted_pnl_pct": np.where(done, np.round(pnl * plans["size_pct"].to_numpy(), 4), np.nan),
+            "mae_pct": np.where(done, np.round(mae * 100, 4), np.nan),
+        }
+    )
+
+
+def run_backtest(trade_plans: List[Dict[str, Any]], history: Dict[str, pd.DataFrame], start: Optional[str] = None) -> pd.DataFrame:
+    """
+    Backtest many plans against per-symbol OHLCV frames (symbol -> DataFrame). Returns one row per plan.
+    """
+    plans = _plan_arrays(trade_plans, start)
+    if plans.empty:
+        return pd.DataFrame()
+    invalid = plans["invalid"] != ""
+    out = [_no_data(plans[invalid], reason="invalid")] if invalid.any() else []
+    for symbol, group in plans[~invalid].groupby("symbol", sort=False):
+        bars = history.get(symbol)
+        if bars is None or bars.empty:
+            out.append(_no_data(group))
+            continue
+        bars = bars.assign(timestamp=pd.to_datetime(bars["timestamp"])).sort_values("timestamp")
+        if getattr(bars["timestamp"].dt, "tz", None) is not None:
+            bars = bars.assign(timestamp=bars["timestamp"].dt.tz_convert("UTC").dt.tz_localize(None))
+        out.append(simulate_symbol(bars, group.reset_index(drop=True)))
+    return pd.concat(out).sort_values("plan_index").reset_index(drop=True)
+
+
+def _load_history(symbols: List[str], interval: str = HISTORY_INTERVAL, limit: int = HISTORY_LIMIT) -> Dict[str, pd.DataFrame]:
+    """
+    Per-symbol OHLCV frames from the kline fetcher (live, locally derived, or the CSV fallback).
+    The still-open live candle is dropped: its close is not final.
+    """
+    from tools.data_tools import fetch_binance_spot_klines
+
+    now = pd.Timestamp.now(tz="UTC")
+    span = pd.Timedelta(milliseconds=interval_ms(interval))
+    history = {}
+    for symbol in symbols:
+        rows = fetch_binance_spot_klines(symbol, interval=interval, limit=limit).get("rows", [])
+        if not rows:
+            continue
+        df = pd.DataFrame(rows)
+        ts = pd.to_datetime(df["timestamp"], utc=True)
+        history[symbol] = df[(ts + span <= now).to_numpy()]
+    return history
+
+
+def summarize_backtest(results: pd.DataFrame) -> Dict[str, Any]:
+    if results.empty:
+        return {"num_plans": 0}
+    filled = results[results["filled"]]
+    return {
+        "num_plans": int(len(results)),
+        "fill_rate": round(float(results["filled"].mean()), 4),
+        "win_rate": round(float((filled["pnl_pct"] > 0).mean()), 4) if len(filled) else None,
+        "avg_pnl_pct": round(float(filled["pnl_pct"].mean()), 4) if len(filled) else None,
+        "total_weighted_pnl_pct": round(float(filled["weighted_pnl_pct"].sum()), 4),
+        "worst_mae_pct": round(float(filled["mae_pct"].max()), 4) if len(filled) else None,
+        "exit_reasons": results["exit_reason"].value_counts().to_dict(),
+    }
+
+
+@traced_tool
+def backtest_trade_plans(trade_plans: List[Dict[str, Any]], start: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Backtest TradePlans (symbol, side, size_pct, entry, stop_loss, take_profit, time_horizon_days)
+    against hourly Binance klines (local price CSV as fallback). start (ISO date) sets when plans go
+    live; by default each plan's horizon ends at the latest closed bar.
+
+    Returns {"summary": {...}, "results": [per plan: filled, fill/exit price+time, exit_reason, pnl_pct, mae_pct]}.
+    Plans with an unreadable entry/stop/target/start get exit_reason "invalid" and an error note.
+    """
+    symbols = sorted({str(p.get("symbol", "")).upper() for p in trade_plans} - {""})
+    history = _load_history(symbols)
+    results = run_backtest(trade_plans, history, start=start)
+    summary = summarize_backtest(results)
+    if results.empty:
+        return {"summary": summary, "results": []}
+    for col in ("fill_time", "exit_time"):
+        results[col] = results[col].map(lambda t: t.isoformat() if pd.notna(t) else None)
+    results = results.astype(object).where(results.notna(), None)
+    return {"summary": summary, "results": results.to_dict(orient="records")}
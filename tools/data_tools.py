@@ -5,8 +5,14 @@ from typing import Any, Dict, Optional
 import pandas as pd
 import requests
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-BINANCE_SPOT_BASE = "https://api.binance.com"
+from tools.prefetch import prefetchable
+from tools.resample import INTERVAL_MS, KLINES, klines_frame
+from tools.resilience import BINANCE_RETRY, CircuitOpenError, DeadlineExceeded, call_with_retry
+from tools.stores import get_price_store, get_trade_store
+from tools.telemetry import record_fallback, traced_tool
+
+# Override (e.g. a local fault-injecting stand-in) with BINANCE_BASE_URL.
+BINANCE_SPOT_BASE = os.getenv("BINANCE_BASE_URL", "https://api.binance.com")
 
 
 def _use_live() -> bool:
@@ -16,35 +22,33 @@ def _use_live() -> bool:
     return os.getenv("USE_BINANCE_LIVE", "1").lower() not in {"0", "false", "no"}
 
 
+@traced_tool
 def load_prices(symbol: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
     """
     Load OHLCV price data from the local sample CSV. Used as fallback when live data is off/unavailable.
     """
-    path = os.path.join(DATA_DIR, "prices.csv")
-    df = pd.read_csv(path, parse_dates=["timestamp"])
-    if symbol:
-        df = df[df["symbol"].str.lower() == symbol.lower()]
-    if start:
-        df = df[df["timestamp"] >= pd.to_datetime(start)]
-    if end:
-        df = df[df["timestamp"] <= pd.to_datetime(end)]
+    df = get_price_store().select(symbol or None, start, end)
     return {"rows": df.reset_index(drop=True).to_dict(orient="records")}
 
 
+@traced_tool
 def load_trades(address: Optional[str] = None, portfolio: Optional[list] = None) -> pd.DataFrame:
     """
     Load trade history from the local sample CSV. A real implementation would call an exchange or chain indexer.
     """
-    path = os.path.join(DATA_DIR, "trades.csv")
-    df = pd.read_csv(path, parse_dates=["timestamp"])
-    if address:
-        df = df[df["address"].str.lower() == address.lower()]
+    store = get_trade_store()
     if portfolio:
-        lower = [addr.lower() for addr in portfolio]
-        df = df[df["address"].str.lower().isin(lower)]
+        lower = {addr.lower() for addr in portfolio}
+        if address:
+            lower &= {address.lower()}
+        frames = [store.select(addr) for addr in sorted(lower)]
+        df = pd.concat(frames) if frames else store.frame.iloc[0:0]
+    else:
+        df = store.select(address or None)
     return {"rows": df.reset_index(drop=True).to_dict(orient="records")}
 
 
+@traced_tool
 def synthesize_dataset_ref(symbol: str, window_days: int = 7) -> dict:
     """
     Generate a lightweight dataset reference for downstream agents (placeholder for real pipelines).
@@ -61,39 +65,61 @@ def synthesize_dataset_ref(symbol: str, window_days: int = 7) -> dict:
 # Live Binance Spot (public, no key required)
 # -----------------------------
 
+def _binance_get(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    GET a public endpoint through the shared "binance" circuit breaker with deadline-bounded,
+    jittered retries (BINANCE_RETRY). Raises CircuitOpenError/DeadlineExceeded or the last error.
+    """
+
+    def _get(timeout: float) -> Any:
+        resp = requests.get(f"{BINANCE_SPOT_BASE}{path}", params=params or {}, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    return call_with_retry("binance", _get, policy=BINANCE_RETRY)
+
+
+def _failure_reason(exc: Exception) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, DeadlineExceeded):
+        return "deadline"
+    return "error"
+
+
+def _kline_rows(symbol: str, frame: pd.DataFrame) -> list:
+    rows = frame[["open", "high", "low", "close", "volume"]].assign(
+        timestamp=pd.to_datetime(frame["open_time"], unit="ms"), symbol=symbol.upper()
+    )
+    return rows[["timestamp", "symbol", "open", "high", "low", "close", "volume"]].to_dict(orient="records")
+
+
+@traced_tool
+@prefetchable
 def fetch_binance_spot_klines(symbol: str, interval: str = "1h", limit: int = 200) -> pd.DataFrame:
     """
     Fetch spot klines (public). Falls back to local prices on error or if live disabled.
     Columns align with load_prices: timestamp, symbol, open, high, low, close, volume.
+    Coarser intervals are derived locally from fresh finer candles already fetched (see tools/resample.py).
     """
     if not _use_live():
+        record_fallback("binance_klines", reason="disabled")
         return load_prices(symbol)
+    local = KLINES.get(symbol, interval, int(limit))
+    if local is not None:
+        return {"rows": _kline_rows(symbol, local)}
     try:
-        resp = requests.get(
-            f"{BINANCE_SPOT_BASE}/api/v3/klines",
-            params={"symbol": symbol.upper(), "interval": interval, "limit": limit},
-            timeout=10,
-        )
-        resp.raise_for_status()
-        rows = resp.json()
-        data = []
-        for r in rows:
-            data.append(
-                {
-                    "timestamp": pd.to_datetime(r[0], unit="ms"),
-                    "symbol": symbol.upper(),
-                    "open": float(r[1]),
-                    "high": float(r[2]),
-                    "low": float(r[3]),
-                    "close": float(r[4]),
-                    "volume": float(r[5]),
-                }
-            )
-        return {"rows": data}
-    except Exception:
+        rows = _binance_get("/api/v3/klines", {"symbol": symbol.upper(), "interval": interval, "limit": limit})
+        frame = klines_frame(rows)
+        if interval in INTERVAL_MS:
+            KLINES.store(symbol, interval, frame)
+        return {"rows": _kline_rows(symbol, frame)}
+    except Exception as e:
+        record_fallback("binance_klines", reason=_failure_reason(e))
         return load_prices(symbol)
 
 
+@traced_tool
 def fetch_binance_24h(symbol: Optional[str] = None) -> Any:
     """
     24h ticker stats (public). Returns dict or list from Binance; caller can parse.
@@ -101,14 +127,13 @@ def fetch_binance_24h(symbol: Optional[str] = None) -> Any:
     if not _use_live():
         return {"status": "disabled", "reason": "USE_BINANCE_LIVE=0"}
     try:
-        params = {"symbol": symbol.upper()} if symbol else {}
-        resp = requests.get(f"{BINANCE_SPOT_BASE}/api/v3/ticker/24hr", params=params, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
+        return _binance_get("/api/v3/ticker/24hr", {"symbol": symbol.upper()} if symbol else None)
     except Exception as e:
-        return {"status": "error", "error": str(e)}
+        return {"status": "error", "reason": _failure_reason(e), "error": str(e)}
 
 
+@traced_tool
+@prefetchable
 def fetch_binance_book_ticker(symbol: Optional[str] = None) -> Any:
     """
     Best bid/ask snapshot (public).
@@ -116,14 +141,13 @@ def fetch_binance_book_ticker(symbol: Optional[str] = None) -> Any:
     if not _use_live():
         return {"status": "disabled", "reason": "USE_BINANCE_LIVE=0"}
     try:
-        params = {"symbol": symbol.upper()} if symbol else {}
-        resp = requests.get(f"{BINANCE_SPOT_BASE}/api/v3/ticker/bookTicker", params=params, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
+        return _binance_get("/api/v3/ticker/bookTicker", {"symbol": symbol.upper()} if symbol else None)
     except Exception as e:
-        return {"status": "error", "error": str(e)}
+        return {"status": "error", "reason": _failure_reason(e), "error": str(e)}
 
 
+@traced_tool
+@prefetchable
 def fetch_binance_depth(symbol: str, limit: int = 20) -> Any:
     """
     Order book depth (public). Keep limit small to reduce weight.
@@ -131,17 +155,12 @@ def fetch_binance_depth(symbol: str, limit: int = 20) -> Any:
     if not _use_live():
         return {"status": "disabled", "reason": "USE_BINANCE_LIVE=0"}
     try:
-        resp = requests.get(
-            f"{BINANCE_SPOT_BASE}/api/v3/depth",
-            params={"symbol": symbol.upper(), "limit": limit},
-            timeout=10,
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return _binance_get("/api/v3/depth", {"symbol": symbol.upper(), "limit": limit})
     except Exception as e:
-        return {"status": "error", "error": str(e)}
+        return {"status": "error", "reason": _failure_reason(e), "error": str(e)}
 
 
+@traced_tool
 def fetch_binance_agg_trades(symbol: str, limit: int = 200) -> Any:
     """
     Aggregated trades (public) for short-term flow/volume analysis.
@@ -149,12 +168,6 @@ def fetch_binance_agg_trades(symbol: str, limit: int = 200) -> Any:
     if not _use_live():
         return {"status": "disabled", "reason": "USE_BINANCE_LIVE=0"}
     try:
-        resp = requests.get(
-            f"{BINANCE_SPOT_BASE}/api/v3/aggTrades",
-            params={"symbol": symbol.upper(), "limit": limit},
-            timeout=10,
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return _binance_get("/api/v3/aggTrades", {"symbol": symbol.upper(), "limit": limit})
     except Exception as e:
-        return {"status": "error", "error": str(e)}
+        return {"status": "error", "reason": _failure_reason(e), "error": str(e)}
@@ -0,0 +1,353 @@
+"""
+Vectorized technical indicators with cached, incrementally extended per-symbol state.
+
+Indicators (defaults in IndicatorParams): RSI and ATR (Wilder smoothing), EMA fast/slow, MACD
+line/signal/histogram, Bollinger bands (population std), and a rolling VWAP over the last
+`vwap` bars. All symbols of a request are stacked into one long (symbol, time) frame and every
+indicator is one grouped pandas/NumPy pass over it, so cost scales with bars, not with symbols.
+
+State per (symbol, interval, params) holds the EMA/Wilder accumulators after the last closed
+candle plus the last few candles the rolling windows need. A later call only folds in candles
+that closed since then (EMAs are continued by seeding the recursion with the cached value), and
+the in-progress candle is computed from that state without being folded in. If the cached state
+no longer overlaps the fetched bars (long idle, or a different source), it is rebuilt.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.resample import INTERVAL_MS
+from tools.telemetry import record_cache, traced_tool
+
+HISTORY_BARS = 500
+MAX_ENTRIES = 1024
+BAR_COLUMNS = ["open_time", "high", "low", "close", "volume"]
+EMA_STATE = ("ema_fast", "ema_slow", "macd_signal", "avg_gain", "avg_loss", "atr", "count")
+OUTPUT_COLUMNS = [
+    "open_time", "close", "rsi", "ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist",
+    "atr", "bb_mid", "bb_upper", "bb_lower", "vwap",
+]
+
+
+@dataclass(frozen=True)
+class IndicatorParams:
+    rsi: int = 14
+    ema_fast: int = 12
+    ema_slow: int = 26
+    macd_signal: int = 9
+    atr: int = 14
+    bb: int = 20
+    bb_k: float = 2.0
+    vwap: int = 20
+
+    @property
+    def window(self) -> int:
+        """Closed candles the rolling indicators need to carry over between calls."""
+        return max(self.bb, self.vwap, 2) - 1
+
+
+def _group_starts(keys: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=int)
+
+
+def _ewm(values: np.ndarray, keys: np.ndarray, alpha: float, seed: np.ndarray) -> np.ndarray:
+    """
+    EMA (adjust=False) per contiguous key group. seed[i] continues group i from a previous call
+    (NaN = cold start: the recursion starts at the group's first valid value).
+    """
+    if not len(values):
+        return values
+    starts = _group_starts(keys)
+    seeded = np.insert(values, starts, seed)
+    seeded_keys = np.insert(keys, starts, keys[starts])
+    out = pd.Series(seeded).groupby(seeded_keys, sort=False).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return np.delete(out, starts + np.arange(len(starts)))
+
+
+def _rolling(values: np.ndarray, keys: np.ndarray, window: int, how: str) -> np.ndarray:
+    grouped = pd.Series(values).groupby(keys, sort=False).rolling(window, min_periods=window)
+    out = grouped.std(ddof=0) if how == "std" else getattr(grouped, how)()
+    return out.to_numpy()
+
+
+def compute_indicators(
+    bars: pd.DataFrame, seeds: pd.DataFrame, params: IndicatorParams = IndicatorParams()
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    One vectorized pass over many symbols.
+
+    bars: key (int), open_time, high, low, close, volume, carried (bool), sorted by (key, open_time).
+        carried rows are already-processed candles kept for the rolling windows / previous close.
+    seeds: EMA_STATE columns (recursion values + candles seen) indexed by key (NaN for cold symbols).
+    Returns (indicator rows for the non-carried bars, new EMA state per key at each group's last row).
+    """
+    keys = bars["key"].to_numpy()
+    h, l, c, v = (bars[col].to_numpy(dtype=float) for col in ("high", "low", "close", "volume"))
+    fresh = ~bars["carried"].to_numpy(dtype=bool)
+    prev_close = bars.groupby("key", sort=False)["close"].shift(1).to_numpy(dtype=float)
+
+    # Rolling windows run over carried + fresh rows so the first fresh rows see full windows.
+    bb_mid = _rolling(c, keys, params.bb, "mean")
+    bb_std = _rolling(c, keys, params.bb, "std")
+    tp = (h + l + c) / 3
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = _rolling(tp * v, keys, params.vwap, "sum") / _rolling(v, keys, params.vwap, "sum")
+
+    # Recursive indicators only over fresh rows, continued from the seeds.
+    k, c_new, pc = keys[fresh], c[fresh], prev_close[fresh]
+    seed_at = lambda name: seeds[name].reindex(k[_group_starts(k)]).to_numpy(dtype=float)  # noqa: E731
+    delta = c_new - pc
+    gain, loss = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    tr = np.fmax(h[fresh] - l[fresh], np.fmax(np.abs(h[fresh] - pc), np.abs(l[fresh] - pc)))
+    avg_gain = _ewm(gain, k, 1 / params.rsi, seed_at("avg_gain"))
+    avg_loss = _ewm(loss, k, 1 / params.rsi, seed_at("avg_loss"))
+    atr = _ewm(tr, k, 1 / params.atr, seed_at("atr"))
+    ema_fast = _ewm(c_new, k, 2 / (params.ema_fast + 1), seed_at("ema_fast"))
+    ema_slow = _ewm(c_new, k, 2 / (params.ema_slow + 1), seed_at("ema_slow"))
+    macd = ema_fast - ema_slow
+    signal = _ewm(macd, k, 2 / (params.macd_signal + 1), seed_at("macd_signal"))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), 100 - 100 / (1 + avg_gain / avg_loss))
+    rsi = np.where(np.isnan(avg_gain) | np.isnan(avg_loss), np.nan, rsi)
+
+    # Candles seen per symbol (across calls); values are hidden until each indicator has warmed up.
+    starts = _group_starts(k)
+    run = np.arange(len(k)) - np.repeat(starts, np.diff(np.r_[starts, len(k)]))
+    count = np.nan_to_num(np.repeat(seed_at("count"), np.diff(np.r_[starts, len(k)]))) + run + 1
+    warm = lambda x, n: np.where(count >= n, x, np.nan)  # noqa: E731
+
+    out = pd.DataFrame(
+        {
+            "key": k,
+            "open_time": bars["open_time"].to_numpy()[fresh],
+            "close": c_new,
+            "rsi": warm(rsi, params.rsi + 1),
+            "ema_fast": warm(ema_fast, params.ema_fast),
+            "ema_slow": warm(ema_slow, params.ema_slow),
+            "macd": warm(macd, params.ema_slow),
+            "macd_signal": warm(signal, params.ema_slow + params.macd_signal - 1),
+            "macd_hist": warm(macd - signal, params.ema_slow + params.macd_signal - 1),
+            "atr": warm(atr, params.atr),
+            "bb_mid": bb_mid[fresh],
+            "bb_upper": (bb_mid + params.bb_k * bb_std)[fresh],
+            "bb_lower": (bb_mid - params.bb_k * bb_std)[fresh],
+            "vwap": vwap[fresh],
+        }
+    )
+    state = pd.DataFrame(
+        {
+            "ema_fast": ema_fast,
+            "ema_slow": ema_slow,
+            "macd_signal": signal,
+            "avg_gain": avg_gain,
+            "avg_loss": avg_loss,
+            "atr": atr,
+            "count": count,
+        },
+        index=k,
+    ).groupby(level=0, sort=False).last()
+    return out, state
+
+
+def _compute_or_empty(bars: pd.DataFrame, seeds: pd.DataFrame, params: IndicatorParams) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if bars.empty:
+        return pd.DataFrame(columns=["key"] + OUTPUT_COLUMNS), pd.DataFrame(columns=list(EMA_STATE))
+    return compute_indicators(bars, seeds, params)
+
+
+class _Entry:
+    __slots__ = ("state", "carry", "history", "last_closed")
+
+    def __init__(self, state: Dict[str, float], carry: pd.DataFrame, history: pd.DataFrame, last_closed: int):
+        self.state = state
+        self.carry = carry
+        self.history = history
+        self.last_closed = last_closed
+
+
+def _bars_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    if not rows:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    df = pd.DataFrame(rows)
+    ts = pd.to_datetime(df["timestamp"], utc=True).dt.tz_localize(None)
+    df = df.assign(open_time=ts.to_numpy(dtype="datetime64[ms]").astype(np.int64))
+    df = df[BAR_COLUMNS].astype({c: float for c in ("high", "low", "close", "volume")})
+    return df.drop_duplicates("open_time", keep="last").sort_values("open_time").reset_index(drop=True)
+
+
+def _fetch_bars(symbol: str, interval: str, limit: int) -> pd.DataFrame:
+    from tools.data_tools import fetch_binance_spot_klines
+
+    return _bars_frame(fetch_binance_spot_klines(symbol, interval=interval, limit=limit).get("rows", []))
+
+
+class IndicatorCache:
+    """
+    Per (symbol, interval, params) indicator state + recent history, extended as candles close.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, history_bars: int = HISTORY_BARS, fetch=_fetch_bars):
+        self.max_entries = max_entries
+        self.history_bars = history_bars
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str, IndicatorParams], _Entry]" = OrderedDict()
+
+    def series(
+        self, symbols: Sequence[str], interval: str = "1h", limit: int = 200, params: IndicatorParams = IndicatorParams()
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Indicator rows (oldest first; the last row may be the in-progress candle) for each symbol.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        span_ms = INTERVAL_MS.get(interval, 0)
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            entries = {s: self._entries.get((s, interval, params)) for s in symbols}
+
+        closed_parts, live_parts, seeds = [], [], {}
+        for key, symbol in enumerate(symbols):
+            bars = self._fetch(symbol, interval, limit).assign(key=key)
+            is_live = bars["open_time"].to_numpy() + span_ms > now_ms
+            closed, live = bars[~is_live], bars[is_live]
+            entry = entries[symbol]
+            warm = entry is not None and bool((closed["open_time"] == entry.last_closed).any())
+            record_cache("indicators", warm)
+            if warm:
+                seeds[key] = entry.state
+                closed_parts.append(entry.carry.assign(key=key, carried=True))
+                closed = closed[closed["open_time"] > entry.last_closed]
+            else:
+                entries[symbol] = None
+            closed_parts.append(closed.assign(carried=False))
+            live_parts.append(live)
+
+        seed_frame = pd.DataFrame.from_dict(seeds, orient="index", columns=list(EMA_STATE))
+        closed_all = pd.concat(closed_parts, ignore_index=True)
+        new_rows, new_state = _compute_or_empty(closed_all, seed_frame, params)
+        # Symbols without newly closed candles keep their previous state.
+        state = new_state.combine_first(seed_frame)
+        carry = closed_all.groupby("key", sort=False).tail(params.window)
+
+        # The in-progress candle: computed from the updated state, never folded into it.
+        live_all = pd.concat(live_parts, ignore_index=True)
+        live_input = pd.concat(
+            [carry[carry["key"].isin(live_all["key"].unique())].assign(carried=True), live_all.assign(carried=False)]
+        ).sort_values(["key", "open_time"], kind="mergesort")
+        live_rows, _ = _compute_or_empty(live_input, state, params) if len(live_all) else (new_rows.iloc[0:0], None)
+
+        fresh_by_key = dict(tuple(new_rows.groupby("key", sort=False)))
+        live_by_key = dict(tuple(live_rows.groupby("key", sort=False)))
+        carry_by_key = dict(tuple(carry.groupby("key", sort=False)))
+        out: Dict[str, pd.DataFrame] = {}
+        with self._lock:
+            for key, symbol in enumerate(symbols):
+                entry = entries[symbol]
+                fresh = fresh_by_key.get(key)
+                if fresh is not None:
+                    fresh = fresh[OUTPUT_COLUMNS]
+                    history = fresh if entry is None else pd.concat([entry.history, fresh], ignore_index=True)
+                    entry = _Entry(
+                        {name: float(state.loc[key, name]) for name in EMA_STATE},
+                        carry_by_key[key][BAR_COLUMNS].reset_index(drop=True),
+                        history.tail(self.history_bars).reset_index(drop=True),
+                        int(fresh["open_time"].iloc[-1]),
+                    )
+                if entry is not None:
+                    self._entries[(symbol, interval, params)] = entry
+                    self._entries.move_to_end((symbol, interval, params))
+                parts = [entry.history] if entry is not None else []
+                if key in live_by_key:
+                    parts.append(live_by_key[key][OUTPUT_COLUMNS])
+                rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=OUTPUT_COLUMNS)
+                out[symbol] = rows.tail(limit).reset_index(drop=True)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return out
+
+
+_cache = IndicatorCache()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    return _cache
+
+
+def _snapshot(df: pd.DataFrame, interval: str) -> Dict[str, Any]:
+    """
+    Latest indicator values plus a few categorical signals, rounded for prompt economy.
+    """
+    if df.empty:
+        return {"status": "no_data"}
+    last = df.iloc[-1]
+    prev = df.iloc[-2] if len(df) > 1 else last
+
+    def r(x: float, nd: int = 4) -> Optional[float]:
+        return None if pd.isna(x) else round(float(x), nd)
+
+    close = float(last["close"])
+    width = last["bb_upper"] - last["bb_lower"]
+    crossed = np.sign(last["macd_hist"]) != np.sign(prev["macd_hist"]) and pd.notna(prev["macd_hist"])
+    return {
+        "as_of": pd.Timestamp(int(last["open_time"]), unit="ms").isoformat(),
+        "interval": interval,
+        "bars": int(len(df)),
+        "close": r(close),
+        "rsi": r(last["rsi"], 2),
+        "rsi_state": None if pd.isna(last["rsi"]) else ("overbought" if last["rsi"] >= 70 else "oversold" if last["rsi"] <= 30 else "neutral"),
+        "ema_fast": r(last["ema_fast"]),
+        "ema_slow": r(last["ema_slow"]),
+        "trend": None if pd.isna(last["ema_slow"]) else ("up" if last["ema_fast"] > last["ema_slow"] else "down"),
+        "macd": r(last["macd"]),
+        "macd_signal": r(last["macd_signal"]),
+        "macd_hist": r(last["macd_hist"]),
+        "macd_cross": ("bullish" if last["macd_hist"] > 0 else "bearish") if crossed else None,
+        "atr": r(last["atr"]),
+        "atr_pct": r(last["atr"] / close * 100, 3) if close else None,
+        "bb_upper": r(last["bb_upper"]),
+        "bb_mid": r(last["bb_mid"]),
+        "bb_lower": r(last["bb_lower"]),
+        "bb_pct_b": r((close - last["bb_lower"]) / width, 3) if pd.notna(width) and width > 0 else None,
+        "vwap": r(last["vwap"]),
+        "close_vs_vwap_pct": r((close / last["vwap"] - 1) * 100, 3) if pd.notna(last["vwap"]) and last["vwap"] else None,
+    }
+
+
+@traced_tool
+def get_technical_indicators(symbols: List[str], interval: str = "1h", history: int = 0) -> Dict[str, Any]:
+    """
+    Precomputed technical indicators for one or more symbols in a single call:
+    RSI(14) with overbought/oversold state, EMA(12/26) trend, MACD(12,26,9) with recent cross,
+    ATR(14) (also as % of price), Bollinger(20, 2) with %b, and 20-bar VWAP.
+
+    history: also return the last N rows (close, rsi, macd_hist, atr, bb_pct_b) per symbol.
+    Prefer this over pulling raw klines to judge momentum, trend or volatility.
+    """
+    history = max(0, min(int(history), 100))
+    params = IndicatorParams()
+    limit = max(200, params.ema_slow * 4, history)
+    series = get_indicator_cache().series(symbols, interval=interval, limit=limit, params=params)
+    out: Dict[str, Any] = {}
+    for symbol, df in series.items():
+        item = _snapshot(df, interval)
+        if history and not df.empty:
+            tail = df.tail(history)
+            width = tail["bb_upper"] - tail["bb_lower"]
+            rows = pd.DataFrame(
+                {
+                    "time": pd.to_datetime(tail["open_time"], unit="ms").map(lambda t: t.isoformat()),
+                    "close": tail["close"].round(4),
+                    "rsi": tail["rsi"].round(2),
+                    "macd_hist": tail["macd_hist"].round(4),
+                    "atr": tail["atr"].round(4),
+                    "bb_pct_b": ((tail["close"] - tail["bb_lower"]) / width.where(width > 0)).round(3),
+                }
+            )
+            item["history"] = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+        out[symbol] = item
+    return {"interval": interval, "indicators": out}
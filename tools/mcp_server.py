@@ -1,29 +1,91 @@
 """
 Minimal MCP server exposing mock web3 data access.
 This is a placeholder to demonstrate MCP integration; in practice, plug real data sources.
+
+Prices and trades are served from the shared in-process stores (tools/stores.py): every
+response is a bounded page with a next_cursor, filtered server-side by date range, and
+optionally downsampled (prices) or aggregated (trades). Store lookups run in worker
+threads so concurrent requests do not block the event loop.
 """
 import asyncio
 from typing import Any, Dict
 
 from google.adk.mcp import mcp_server
 
-from tools.data_tools import load_prices, load_trades
+from tools.stores import (
+    DEFAULT_PAGE_SIZE,
+    aggregate_trades,
+    downsample_ohlcv,
+    get_price_store,
+    get_trade_store,
+    paginate,
+    query_hash,
+    records,
+)
+from tools.telemetry import span
 
+# Cap on in-flight store queries; extra requests wait instead of piling onto the thread pool.
+MAX_CONCURRENT_QUERIES = 8
+_query_slots = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
 
-async def get_historical_prices(params: Dict[str, Any]) -> Dict[str, Any]:
+
+async def _run_query(name: str, fn, params: Dict[str, Any]) -> Dict[str, Any]:
+    async with _query_slots:
+        with span(name, kind="tool", transport="mcp"):
+            try:
+                return await asyncio.to_thread(fn, params)
+            except ValueError as e:
+                return {"status": "error", "error": str(e)}
+
+
+def _historical_prices(params: Dict[str, Any]) -> Dict[str, Any]:
+    store = get_price_store()
     symbol = params.get("symbol")
-    window = params.get("window_days", 7)
-    df = load_prices(symbol=symbol)
-    # Return limited rows for brevity
-    rows = df.tail(window).to_dict(orient="records")
-    return {"rows": rows}
+    if not symbol:
+        raise ValueError("symbol is required")
+    start, end = params.get("start"), params.get("end")
+    limit = params.get("limit", DEFAULT_PAGE_SIZE)
+    if not (start or end or params.get("cursor")) and params.get("window_days"):
+        # Back-compat: window_days without explicit dates means "the last N rows".
+        df = store.select(symbol).tail(int(params["window_days"]))
+        return {"rows": records(df), "total": len(df), "next_cursor": None}
+    interval = params.get("interval")
+    if interval:
+        # Rows and cursor version must come from the same snapshot, or a reload in between
+        # would issue a cursor for data this page was not cut from.
+        selected, version = store.select_versioned(symbol, start, end)
+        df = downsample_ohlcv(selected, interval)
+        query = query_hash(key=symbol.lower(), start=start, end=end, interval=interval)
+        return {**paginate(df, version, query, params.get("cursor"), limit), "interval": interval}
+    return store.page(symbol, start=start, end=end, cursor=params.get("cursor"), limit=limit)
 
 
-async def get_trades_for_address(params: Dict[str, Any]) -> Dict[str, Any]:
+def _trades_for_address(params: Dict[str, Any]) -> Dict[str, Any]:
+    store = get_trade_store()
     address = params.get("address")
-    df = load_trades(address=address)
-    rows = df.to_dict(orient="records")
-    return {"rows": rows}
+    if not address:
+        raise ValueError("address is required")
+    start, end = params.get("start"), params.get("end")
+    if params.get("aggregate"):
+        df = store.select(address, start, end)
+        return {"summary": aggregate_trades(df), "total": len(df)}
+    return store.page(address, start=start, end=end, cursor=params.get("cursor"), limit=params.get("limit", DEFAULT_PAGE_SIZE))
+
+
+async def get_historical_prices(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    params: symbol (required), start/end (ISO dates), limit (<=1000), cursor (from previous page),
+    interval (optional pandas offset alias, e.g. '1D'/'1W', to downsample OHLCV), window_days (legacy tail).
+    """
+    return await _run_query("mcp_get_historical_prices", _historical_prices, params)
+
+
+async def get_trades_for_address(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    params: address (required), start/end (ISO dates), limit (<=1000), cursor (from previous page),
+    aggregate (bool: per symbol/side counts, quantity, notional, VWAP instead of raw rows).
+    """
+    return await _run_query("mcp_get_trades_for_address", _trades_for_address, params)
 
 
 def main():
@@ -0,0 +1,329 @@
+"""
+Position and PnL engine over load_trades data.
+
+Lots are matched per (address, symbol) with FIFO or average cost, fully vectorized across
+all groups:
+- matched sell quantity follows M_k = min(M_{k-1} + q_k, B_k) (never sell more than was bought
+  so far), which unrolls to cumulative sells + a running minimum, i.e. groupby cumsum/cummin;
+- FIFO cost of the units a sell consumes is a lookup on the cumulative buy-cost curve (np.interp
+  over global cumulative buy quantity), so no lot queue is walked in Python;
+- average cost is the linear recurrence c_k = a_k * c_{k-1} + b_k, solved per flat-to-flat
+  segment with cumulative products.
+
+Spot wallets cannot go short, so sells beyond the known inventory (e.g. history that starts
+mid-position) are reported as unmatched_sell_qty with no cost basis instead of opening a short.
+
+PositionBook keeps the remaining lots and realized PnL per (address, symbol) so new trades are
+applied incrementally: the open lots are replayed as synthetic buys ahead of the new rows.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tools.stores import get_trade_store
+from tools.telemetry import record_cache, traced_tool
+
+METHODS = ("fifo", "average")
+MARK_TTL_S = 30.0
+_GROUP = ["address", "symbol"]
+
+
+def _factorize(values: pd.Series, transform) -> tuple:
+    """
+    Integer codes + normalized uniques; the string transform runs once per unique value.
+    """
+    codes, uniques = pd.factorize(values.astype(str))
+    norm_codes, norm_uniques = pd.factorize(transform(pd.Index(uniques, dtype=object).str))
+    return norm_codes[codes], np.asarray(norm_uniques, dtype=object)
+
+
+def _normalize(trades: pd.DataFrame) -> pd.DataFrame:
+    df = trades[["address", "symbol", "side", "quantity", "price"] + (["timestamp"] if "timestamp" in trades else [])].copy()
+    address_codes, addresses = _factorize(df["address"], lambda s: s.lower())
+    symbol_codes, symbols = _factorize(df["symbol"], lambda s: s.upper())
+    side_codes, sides = _factorize(df["side"], lambda s: s.lower())
+    df["address"] = addresses[address_codes]
+    df["symbol"] = symbols[symbol_codes]
+    df["is_buy"] = np.isin(sides, ["buy", "long"])[side_codes]
+    df["_gkey"] = address_codes.astype(np.int64) * max(len(symbols), 1) + symbol_codes
+    df["quantity"] = df["quantity"].astype(float).abs()
+    df["price"] = df["price"].astype(float)
+    if "timestamp" not in df:
+        df["timestamp"] = pd.NaT
+    return df
+
+
+def match_lots(trades: pd.DataFrame, method: str = "fifo") -> Dict[str, pd.DataFrame]:
+    """
+    Match lots for every (address, symbol) in trades (rows in execution order within a group).
+
+    Returns {"trades": per-row matched_qty/unmatched_qty/realized_pnl, "state": per-group
+    quantity/cost_basis/realized_pnl/unmatched_sell_qty/num_trades, "lots": open lots (qty, price)}.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    df = _normalize(trades)
+    if df.empty:
+        empty_state = pd.DataFrame(columns=_GROUP + ["quantity", "cost_basis", "realized_pnl", "unmatched_sell_qty", "num_trades"])
+        return {"trades": df, "state": empty_state, "lots": pd.DataFrame(columns=_GROUP + ["quantity", "price"])}
+
+    # Stable integer sort keeps execution order within each (address, symbol) group.
+    df = df.iloc[np.argsort(df["_gkey"].to_numpy(), kind="stable")].reset_index(drop=True)
+    gkey = df["_gkey"].to_numpy()
+    gid = np.cumsum(np.r_[True, gkey[1:] != gkey[:-1]]) - 1
+    q, p, is_buy = df["quantity"].to_numpy(), df["price"].to_numpy(), df["is_buy"].to_numpy()
+    buy_q = np.where(is_buy, q, 0.0)
+    sell_q = np.where(is_buy, 0.0, q)
+
+    bought = pd.Series(buy_q).groupby(gid).cumsum().to_numpy()
+    sold = pd.Series(sell_q).groupby(gid).cumsum().to_numpy()
+    shortfall = pd.Series(np.minimum(0.0, bought - sold)).groupby(gid).cummin().to_numpy()
+    matched_cum = sold + shortfall
+    first = np.r_[True, gid[1:] != gid[:-1]]
+    prev_matched = np.where(first, 0.0, np.r_[0.0, matched_cum[:-1]])
+    matched = matched_cum - prev_matched
+    inventory = bought - matched_cum
+    prev_inventory = np.where(first, 0.0, np.r_[0.0, inventory[:-1]])
+
+    # FIFO cost curve: global cumulative buy quantity -> cumulative buy cost.
+    global_bought = np.cumsum(buy_q)
+    base = global_bought - bought  # global offset of each group's first unit
+    buy_rows = buy_q > 0
+    xp = np.r_[0.0, global_bought[buy_rows]]
+    fp = np.r_[0.0, np.cumsum(buy_q * p)[buy_rows]]
+    cost_at = lambda x: np.interp(x, xp, fp)
+
+    if method == "fifo":
+        consumed_cost = cost_at(base + matched_cum) - cost_at(base + prev_matched)
+        cost_after = cost_at(base + bought) - cost_at(base + matched_cum)
+    else:
+        # Average cost: sells scale the basis by inventory/prev_inventory; buys add q*p.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(~is_buy & (prev_inventory > 0), inventory / prev_inventory, 1.0)
+        segment = np.cumsum(first | (prev_inventory <= 0))
+        prod = pd.Series(scale).groupby(segment).cumprod().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            adds = np.where(prod > 0, buy_q * p / prod, 0.0)
+        cost_after = prod * pd.Series(adds).groupby(segment).cumsum().to_numpy()
+        prev_cost = np.where(first, 0.0, np.r_[0.0, cost_after[:-1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_before = np.where(prev_inventory > 0, prev_cost / prev_inventory, 0.0)
+        consumed_cost = matched * avg_before
+
+    realized = np.where(is_buy, 0.0, matched * p - consumed_cost)
+    df["matched_qty"] = np.where(is_buy, 0.0, matched)
+    df["unmatched_qty"] = sell_q - df["matched_qty"].to_numpy()
+    df["realized_pnl"] = realized
+    df["inventory"] = inventory
+    df["cost_basis"] = cost_after
+
+    last = ~np.r_[gid[1:] == gid[:-1], False]
+    state = df.loc[last, _GROUP + ["inventory", "cost_basis"]].rename(columns={"inventory": "quantity"})
+    totals = df.groupby(gid, sort=False).agg(realized_pnl=("realized_pnl", "sum"), unmatched_sell_qty=("unmatched_qty", "sum"), num_trades=("price", "size"))
+    state = pd.concat([state.reset_index(drop=True), totals.reset_index(drop=True)], axis=1)
+
+    if method == "fifo":
+        end_matched = pd.Series(matched_cum).groupby(gid).transform("last").to_numpy()
+        remaining = np.minimum(buy_q, np.maximum(bought - end_matched, 0.0))
+        lots = df.loc[remaining > 0, _GROUP + ["price"]].assign(quantity=remaining[remaining > 0])
+    else:
+        open_state = state[state["quantity"] > 0]
+        lots = open_state[_GROUP].assign(price=open_state["cost_basis"] / open_state["quantity"], quantity=open_state["quantity"])
+    return {"trades": df, "state": state, "lots": lots[_GROUP + ["quantity", "price"]].reset_index(drop=True)}
+
+
+_mark_cache: Dict[str, tuple] = {}
+_mark_lock = threading.Lock()
+
+
+def latest_closes(symbols: Iterable[str]) -> Dict[str, float]:
+    """
+    Latest kline close per symbol (live with local fallback), cached for MARK_TTL_S seconds.
+    """
+    from tools.data_tools import fetch_binance_spot_klines
+
+    marks = {}
+    now = time.monotonic()
+    for symbol in {s.upper() for s in symbols}:
+        with _mark_lock:
+            cached = _mark_cache.get(symbol)
+        if cached and now - cached[1] < MARK_TTL_S:
+            record_cache("marks", True)
+            marks[symbol] = cached[0]
+            continue
+        record_cache("marks", False)
+        rows = fetch_binance_spot_klines(symbol, interval="1m", limit=1).get("rows", [])
+        if not rows:
+            continue
+        close = float(max(rows, key=lambda r: r["timestamp"])["close"])
+        with _mark_lock:
+            _mark_cache[symbol] = (close, now)
+        marks[symbol] = close
+    return marks
+
+
+def mark_positions(state: pd.DataFrame, marks: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Add mark_price, market_value, unrealized_pnl and avg_cost to a per-group state frame.
+    """
+    if state.empty:
+        return state.assign(avg_cost=[], mark_price=[], market_value=[], unrealized_pnl=[])
+    marks = marks if marks is not None else latest_closes(state["symbol"].unique())
+    out = state.copy()
+    out["avg_cost"] = np.where(out["quantity"] > 0, out["cost_basis"] / out["quantity"].where(out["quantity"] > 0), 0.0)
+    out["mark_price"] = out["symbol"].map(marks).astype(float)
+    out["market_value"] = out["quantity"] * out["mark_price"]
+    out["unrealized_pnl"] = out["market_value"] - out["cost_basis"]
+    return out
+
+
+def exposure_by_symbol(positions: pd.DataFrame) -> pd.DataFrame:
+    if positions.empty:
+        return pd.DataFrame(columns=["symbol", "quantity", "market_value", "realized_pnl", "unrealized_pnl", "weight"])
+    out = positions.groupby("symbol", as_index=False)[["quantity", "market_value", "realized_pnl", "unrealized_pnl"]].sum()
+    total = out["market_value"].sum()
+    out["weight"] = out["market_value"] / total if total else 0.0
+    return out
+
+
+class PositionBook:
+    """
+    Cached per-(address, symbol) positions that update incrementally on new trades.
+    New trades are applied on top of the stored open lots; sync() keeps the book in step with
+    a trade store by (store version, row offset), applying only appended rows.
+    """
+
+    def __init__(self, method: str = "fifo"):
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        self.method = method
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.lots = pd.DataFrame(columns=_GROUP + ["quantity", "price"])
+        self.state = pd.DataFrame(columns=_GROUP + ["quantity", "cost_basis", "realized_pnl", "unmatched_sell_qty", "num_trades"])
+        self._source_version: Optional[int] = None
+        self._offset = 0
+        # Latest applied trade time per (address, symbol), to spot out-of-order appends.
+        self._latest: Dict[tuple, pd.Timestamp] = {}
+
+    def apply(self, trades: pd.DataFrame) -> int:
+        """
+        Apply trades that are new to the book (every row is applied; the caller tracks what was
+        already seen, see sync()). Returns rows applied.
+        """
+        if trades.empty:
+            return 0
+        new = _normalize(trades).sort_values("timestamp", kind="mergesort")
+        with self._lock:
+            touched = new[_GROUP].drop_duplicates()
+            key = pd.MultiIndex.from_frame(touched)
+            lot_mask = pd.MultiIndex.from_frame(self.lots[_GROUP]).isin(key) if len(self.lots) else np.zeros(0, dtype=bool)
+            prior = self.lots[lot_mask].assign(side="buy")
+            result = match_lots(pd.concat([prior, new], ignore_index=True), self.method)
+
+            state_idx = pd.MultiIndex.from_frame(self.state[_GROUP]) if len(self.state) else pd.MultiIndex.from_tuples([], names=_GROUP)
+            old = self.state[state_idx.isin(key)].set_index(_GROUP) if len(self.state) else None
+            fresh = result["state"].set_index(_GROUP)
+            # Replayed lots are synthetic buys: don't count them as trades again.
+            replayed = prior.groupby(_GROUP).size().reindex(fresh.index, fill_value=0)
+            fresh["num_trades"] -= replayed
+            if old is not None and len(old):
+                for col in ("realized_pnl", "unmatched_sell_qty", "num_trades"):
+                    fresh[col] = fresh[col].add(old[col].reindex(fresh.index, fill_value=0), fill_value=0)
+            self.state = pd.concat(
+                [self.state[~state_idx.isin(key)] if len(self.state) else self.state, fresh.reset_index()], ignore_index=True
+            )
+            self.lots = pd.concat([self.lots[~lot_mask], result["lots"]], ignore_index=True)
+            for group, ts in new.groupby(_GROUP)["timestamp"].max().items():
+                if pd.notna(ts) and not (self._latest.get(group, ts) > ts):
+                    self._latest[group] = ts
+            return len(new)
+
+    def _out_of_order(self, trades: pd.DataFrame) -> bool:
+        """
+        True if any trade predates one already applied for its (address, symbol): matching it
+        after the fact would differ from matching in time order, so the book must be rebuilt.
+        """
+        if trades.empty or not self._latest:
+            return False
+        earliest = _normalize(trades).groupby(_GROUP)["timestamp"].min()
+        with self._lock:
+            latest = {group: self._latest.get(group) for group in earliest.index}
+        return any(latest[group] is not None and ts < latest[group] for group, ts in earliest.items())
+
+    def sync(self, store) -> int:
+        """
+        Bring the book up to date with an IndexedCsvStore. Rows appended to the CSV since the last
+        sync (past the applied row offset) are applied on top of the open lots; any other change
+        (edited or truncated file, or an appended trade older than one already applied for its
+        address/symbol) rebuilds the book from the current snapshot. An unchanged store costs one
+        version check. Returns rows applied.
+        """
+        with self._sync_lock:
+            if store.version == self._source_version:
+                return 0
+            new, version, total = store.rows_since(self._source_version, self._offset)
+            if new is not None and not self._out_of_order(new):
+                applied = self.apply(new)
+            else:
+                frame, version = store.select_versioned()
+                total = len(frame)
+                with self._lock:
+                    self._reset()
+                applied = self.apply(frame)
+            self._source_version, self._offset = version, total
+            return applied
+
+    def positions(self, addresses: Optional[List[str]] = None, marks: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        with self._lock:
+            state = self.state.copy()
+        if addresses:
+            state = state[state["address"].isin([a.lower() for a in addresses])]
+        return mark_positions(state.reset_index(drop=True), marks)
+
+
+_books: Dict[str, PositionBook] = {}
+_books_lock = threading.Lock()
+
+
+def get_position_book(method: str = "fifo") -> PositionBook:
+    """
+    Process-wide book per matching method, kept in sync with the shared trade store.
+    """
+    with _books_lock:
+        book = _books.get(method)
+        if book is None:
+            book = _books[method] = PositionBook(method)
+    book.sync(get_trade_store())
+    return book
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return df.round(8).astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+@traced_tool
+def compute_positions(address: Optional[str] = None, portfolio: Optional[list] = None, method: str = "fifo") -> Dict[str, Any]:
+    """
+    Positions and PnL for an address or portfolio (list of addresses) from trade history.
+    method: "fifo" or "average" cost. Unrealized PnL is marked to the latest kline close.
+
+    Returns {"positions": [per address+symbol: quantity, avg_cost, realized_pnl, unrealized_pnl, ...],
+             "exposure": [per symbol: quantity, market_value, weight, ...], "totals": {...}}.
+    """
+    addresses = list(portfolio or []) + ([address] if address else [])
+    positions = get_position_book(method).positions(addresses or None)
+    exposure = exposure_by_symbol(positions)
+    unrealized = positions["unrealized_pnl"].sum(min_count=1) if len(positions) else 0.0
+    totals = {
+        "realized_pnl": round(float(positions["realized_pnl"].sum()), 8) if len(positions) else 0.0,
+        "unrealized_pnl": round(float(unrealized), 8) if pd.notna(unrealized) else None,
+        "market_value": round(float(positions["market_value"].sum()), 8) if len(positions) else 0.0,
+    }
+    return {"method": method, "positions": _records(positions), "exposure": _records(exposure), "totals": totals}
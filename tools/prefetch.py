@@ -0,0 +1,217 @@
+"""
+Speculative prefetch of per-symbol market data.
+
+As soon as run_workflow knows the symbols of its ideas, it asks for the klines, depth and
+book ticker the DataEngineering/Analytics/Risk agents are about to request. Fetches run on a
+small shared thread pool while the LLM stages are busy; tools decorated with @prefetchable
+serve a matching warm entry (waiting for it if it is still in flight) instead of going to the
+network again. Entries are reference-counted per owner (a workflow): when no remaining idea
+needs a symbol its pending fetches are cancelled and its results dropped, so unused
+speculation costs at most one request and memory stays bounded.
+"""
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from tools.telemetry import METRICS, record_cache, span
+
+PREFETCH_WORKERS = 8
+PREFETCH_TTL_S = 60.0
+# How long a tool call waits on an in-flight prefetch before fetching on its own.
+PREFETCH_WAIT_S = 10.0
+
+# (tool name, kwargs) issued per symbol: the arguments the downstream agents/tools use.
+DEFAULT_PLAN: Tuple[Tuple[str, Dict[str, Any]], ...] = (
+    ("fetch_binance_spot_klines", {"interval": "1h", "limit": 200}),
+    ("fetch_binance_spot_klines", {"interval": "1d", "limit": 365}),  # risk model history
+    ("fetch_binance_depth", {"limit": 20}),
+    ("fetch_binance_book_ticker", {}),
+)
+
+_fetchers: Dict[str, Any] = {}
+_signatures: Dict[str, inspect.Signature] = {}
+
+
+def _cache_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> Optional[tuple]:
+    try:
+        bound = _signatures[name].bind(*args, **kwargs)
+    except TypeError:
+        return None
+    bound.apply_defaults()
+    values = tuple(
+        (k, v.upper() if k == "symbol" and isinstance(v, str) else v) for k, v in bound.arguments.items()
+    )
+    try:
+        hash(values)
+    except TypeError:
+        return None
+    return (name,) + values
+
+
+def _run_fetch(name: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    with span(name, kind="prefetch"):
+        return _fetchers[name](*args, **kwargs)
+
+
+class _Entry:
+    __slots__ = ("future", "created", "owners")
+
+    def __init__(self, future: Future, owner: str):
+        self.future = future
+        self.created = time.monotonic()
+        self.owners: Set[str] = {owner}
+
+
+class Prefetcher:
+    """
+    Deduplicated, owner-scoped store of in-flight and completed speculative fetches.
+    """
+
+    def __init__(self, max_workers: int = PREFETCH_WORKERS, ttl_s: float = PREFETCH_TTL_S):
+        self.ttl_s = ttl_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, _Entry] = {}
+
+    def _expire(self, now: float) -> None:
+        stale = [k for k, e in self._entries.items() if e.future.done() and now - e.created > self.ttl_s]
+        for key in stale:
+            del self._entries[key]
+
+    def submit(self, owner: str, name: str, *args: Any, **kwargs: Any) -> Optional[tuple]:
+        """
+        Start fetching name(*args, **kwargs) in the background unless it is already warm.
+        """
+        key = _cache_key(name, args, kwargs)
+        if key is None:
+            return None
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.owners.add(owner)
+                return key
+            # Copy the caller's context so the fetch span nests under the workflow trace.
+            ctx = contextvars.copy_context()
+            future = self._executor.submit(ctx.run, _run_fetch, name, args, kwargs)
+            self._entries[key] = _Entry(future, owner)
+        METRICS.inc("prefetch_total", tool=name, status="issued")
+        return key
+
+    def lookup(self, key: Optional[tuple], wait_s: float = PREFETCH_WAIT_S) -> Tuple[bool, Any]:
+        """
+        (True, result) for a usable warm entry, else (False, None). Waits up to wait_s for
+        an in-flight fetch; failed, cancelled or upstream-error results count as misses.
+        """
+        if key is None:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.future.done() and time.monotonic() - entry.created > self.ttl_s:
+                del self._entries[key]
+                entry = None
+        if entry is None:
+            return False, None
+        try:
+            result = entry.future.result(timeout=wait_s)
+        except Exception:  # cancelled, still running after wait_s, or raised
+            return False, None
+        if isinstance(result, dict) and result.get("status") == "error":
+            return False, None
+        METRICS.inc("prefetch_total", tool=key[0], status="used")
+        return True, result
+
+    def release(self, owner: str, symbols: Optional[Iterable[str]] = None) -> int:
+        """
+        Drop owner's interest in symbols (all of its entries when None). Entries nobody else
+        holds are removed and, if still queued, cancelled. Returns the number cancelled.
+        """
+        wanted = {s.upper() for s in symbols} if symbols is not None else None
+        cancelled = 0
+        with self._lock:
+            for key in list(self._entries):
+                entry = self._entries[key]
+                if owner not in entry.owners or (wanted is not None and dict(key[1:]).get("symbol") not in wanted):
+                    continue
+                entry.owners.discard(owner)
+                if entry.owners:
+                    continue
+                del self._entries[key]
+                if entry.future.cancel():
+                    cancelled += 1
+                    METRICS.inc("prefetch_total", tool=key[0], status="cancelled")
+        return cancelled
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for e in self._entries.values() if not e.future.done())
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+PREFETCH = Prefetcher()
+
+
+def prefetchable(func):
+    """
+    Decorator for fetch tools: serve a warm prefetch entry for identical arguments if one exists.
+    The undecorated function is what the prefetcher runs, so there is no recursion.
+    """
+    name = func.__name__
+    _fetchers[name] = func
+    _signatures[name] = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        hit, result = PREFETCH.lookup(_cache_key(name, args, kwargs))
+        record_cache("prefetch", hit)
+        if hit:
+            return result
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class PrefetchHandle:
+    """
+    One workflow's speculative fetches. Call done(symbol) as each idea finishes; close() at the end.
+    """
+
+    def __init__(self, owner: str, symbols: List[str], plan=DEFAULT_PLAN, prefetcher: Prefetcher = PREFETCH):
+        self.owner = owner
+        self._prefetcher = prefetcher
+        # Remaining ideas per symbol: a symbol is released when its last idea is done.
+        self._remaining: Dict[str, int] = {}
+        for symbol in symbols:
+            self._remaining[symbol.upper()] = self._remaining.get(symbol.upper(), 0) + 1
+        for symbol in self._remaining:
+            for name, kwargs in plan:
+                prefetcher.submit(owner, name, symbol, **kwargs)
+
+    def done(self, symbol: Optional[str]) -> None:
+        if not symbol:
+            return
+        symbol = symbol.upper()
+        left = self._remaining.get(symbol, 0) - 1
+        if left > 0:
+            self._remaining[symbol] = left
+            return
+        self._remaining.pop(symbol, None)
+        self._prefetcher.release(self.owner, [symbol])
+
+    def close(self) -> None:
+        self._remaining.clear()
+        self._prefetcher.release(self.owner)
+
+
+def start_prefetch(owner: str, symbols: Iterable[Optional[str]]) -> PrefetchHandle:
+    """
+    Kick off background fetches of DEFAULT_PLAN for every symbol (one entry per idea).
+    """
+    return PrefetchHandle(owner, [s for s in symbols if isinstance(s, str) and s.strip()])
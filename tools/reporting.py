@@ -10,7 +10,8 @@ def save_report(content: str, prefix: str = "report") -> str:
     """
     Save a markdown report and return its path.
     """
-    ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    # Microseconds keep concurrent workflows (e.g. parallel evaluations) from overwriting each other.
+    ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")
     path = REPORT_DIR / f"{prefix}-{ts}.md"
     path.write_text(content)
     return str(path)
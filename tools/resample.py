@@ -0,0 +1,208 @@
+"""
+Local multi-interval kline engine.
+
+Every live kline fetch is merged into a per-(symbol, interval) series. A later request for a
+coarser interval (e.g. 4h or 1d while fresh 1h candles are held, 1h from 5m, ...) is derived
+locally instead of going upstream, so stages asking for different intervals of one symbol
+share one fetch and see the same underlying candles.
+
+Resampling is a single vectorized pass (bucket ids + ufunc.reduceat) with Binance's alignment:
+buckets are aligned to the UTC epoch, weeks to Monday 00:00 UTC. Partial-bar semantics:
+- a leading bucket whose first fine candle is not at the bucket start is truncated history and
+  is dropped (its open/high/low would be wrong);
+- the trailing bucket may be in progress, exactly like Binance's live candle, and is kept as
+  long as its fine candles are contiguous from the bucket start;
+- any other bucket with missing fine candles is a gap, and the request goes upstream instead.
+Derived series are cached per (symbol, source, target) until the source series changes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.telemetry import record_cache
+
+MINUTE_MS = 60_000
+INTERVAL_MS: Dict[str, int] = {
+    "1m": MINUTE_MS,
+    "3m": 3 * MINUTE_MS,
+    "5m": 5 * MINUTE_MS,
+    "15m": 15 * MINUTE_MS,
+    "30m": 30 * MINUTE_MS,
+    "1h": 60 * MINUTE_MS,
+    "2h": 120 * MINUTE_MS,
+    "4h": 240 * MINUTE_MS,
+    "6h": 360 * MINUTE_MS,
+    "8h": 480 * MINUTE_MS,
+    "12h": 720 * MINUTE_MS,
+    "1d": 1440 * MINUTE_MS,
+    "3d": 3 * 1440 * MINUTE_MS,
+    "1w": 7 * 1440 * MINUTE_MS,
+}
+# 1970-01-01 was a Thursday; Binance weekly candles open on Monday.
+WEEK_OFFSET_MS = 4 * 1440 * MINUTE_MS
+
+# A stored series is "current" (its last candle reflects now) for this long after its fetch.
+KLINE_FRESH_S = 30.0
+MAX_BARS_PER_SERIES = 5000
+MAX_SERIES = 512
+
+COLUMNS = ["open_time", "open", "high", "low", "close", "volume"]
+
+
+def interval_ms(interval: str) -> int:
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported kline interval: {interval!r}") from None
+
+
+def _offset(dst_ms: int) -> int:
+    return WEEK_OFFSET_MS if dst_ms == INTERVAL_MS["1w"] else 0
+
+
+def can_derive(src: str, dst: str) -> bool:
+    """True if dst candles are whole, aligned groups of src candles."""
+    src_ms, dst_ms = interval_ms(src), interval_ms(dst)
+    return dst_ms > src_ms and dst_ms % src_ms == 0 and _offset(dst_ms) % src_ms == 0
+
+
+def klines_frame(rows: list) -> pd.DataFrame:
+    """
+    Raw Binance kline arrays -> frame with open_time (ms) and float OHLCV, in one conversion.
+    """
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+    raw = np.asarray([r[:6] for r in rows], dtype=float)
+    frame = pd.DataFrame(raw, columns=COLUMNS)
+    frame["open_time"] = frame["open_time"].astype(np.int64)
+    return frame
+
+
+def resample_klines(bars: pd.DataFrame, src: str, dst: str) -> pd.DataFrame:
+    """
+    Aggregate src candles (open_time-sorted, unique) into dst candles.
+    Returns COLUMNS plus "complete" (all fine candles present) and "gap" (missing candles before
+    the last bucket); truncated leading buckets are already dropped.
+    """
+    if not can_derive(src, dst):
+        raise ValueError(f"Cannot derive {dst} klines from {src}")
+    src_ms, dst_ms = interval_ms(src), interval_ms(dst)
+    if bars.empty:
+        return pd.DataFrame(columns=COLUMNS + ["complete", "gap"])
+    t = bars["open_time"].to_numpy(dtype=np.int64)
+    offset = _offset(dst_ms)
+    bucket = (t - offset) // dst_ms * dst_ms + offset
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+    count = ends - starts + 1
+    aligned = t[starts] == bucket[starts]
+    # Fine candles are unique and aligned, so "contiguous" == span matches count.
+    contiguous = (t[ends] - t[starts]) // src_ms + 1 == count
+    complete = aligned & (count == dst_ms // src_ms)
+
+    o, h, l, c, v = (bars[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close", "volume"))
+    out = pd.DataFrame(
+        {
+            "open_time": bucket[starts],
+            "open": o[starts],
+            "high": np.maximum.reduceat(h, starts),
+            "low": np.minimum.reduceat(l, starts),
+            "close": c[ends],
+            "volume": np.add.reduceat(v, starts),
+            "complete": complete,
+        }
+    )
+    last = np.arange(len(starts)) == len(starts) - 1
+    # Incomplete non-final buckets are gaps; the final one may simply be in progress.
+    out["gap"] = ~complete & ~last | (last & ~(aligned & contiguous))
+    # A leading bucket that starts mid-way is truncated history, not a gap: drop it.
+    if not aligned[0]:
+        out = out.iloc[1:]
+    return out.reset_index(drop=True)
+
+
+class KlineCache:
+    """
+    Fetched kline series per (symbol, interval) plus derived coarser series, bounded in size.
+    """
+
+    def __init__(self, max_series: int = MAX_SERIES, max_bars: int = MAX_BARS_PER_SERIES, fresh_s: float = KLINE_FRESH_S):
+        self.max_series = max_series
+        self.max_bars = max_bars
+        self.fresh_s = fresh_s
+        self._lock = threading.Lock()
+        # (symbol, interval) -> (fetched_at, version, frame)
+        self._series: "OrderedDict[Tuple[str, str], Tuple[float, int, pd.DataFrame]]" = OrderedDict()
+        # (symbol, src, dst) -> (source version, derived frame)
+        self._derived: Dict[Tuple[str, str, str], Tuple[int, pd.DataFrame]] = {}
+        self._version = 0
+
+    def store(self, symbol: str, interval: str, frame: pd.DataFrame) -> None:
+        """
+        Merge a fresh fetch into the stored series (newer rows win, so the live candle updates).
+        """
+        interval_ms(interval)
+        key = (symbol.upper(), interval)
+        with self._lock:
+            previous = self._series.get(key)
+            if previous is not None and not previous[2].empty:
+                frame = pd.concat([previous[2], frame])
+            frame = (
+                frame.drop_duplicates("open_time", keep="last").sort_values("open_time").tail(self.max_bars).reset_index(drop=True)
+            )
+            self._version += 1
+            self._series[key] = (time.monotonic(), self._version, frame)
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                (old_symbol, old_interval), _ = self._series.popitem(last=False)
+                for derived_key in [k for k in self._derived if k[0] == old_symbol and k[1] == old_interval]:
+                    del self._derived[derived_key]
+
+    def _fresh_sources(self, symbol: str, dst: str) -> list:
+        now = time.monotonic()
+        sources = []
+        for (sym, interval), (fetched_at, version, frame) in self._series.items():
+            if sym != symbol or now - fetched_at > self.fresh_s:
+                continue
+            if interval == dst or can_derive(interval, dst):
+                sources.append((interval, version, frame))
+        # Coarsest source first: fewest rows to aggregate.
+        return sorted(sources, key=lambda s: -interval_ms(s[0]))
+
+    def get(self, symbol: str, interval: str, limit: int) -> Optional[pd.DataFrame]:
+        """
+        The last `limit` candles of symbol/interval from fresh local data, or None if they cannot be
+        served correctly (no fresh source, not enough history, or a gap in the requested window).
+        """
+        symbol = symbol.upper()
+        if interval not in INTERVAL_MS or limit <= 0:
+            return None
+        with self._lock:
+            for src, version, frame in self._fresh_sources(symbol, interval):
+                if src == interval:
+                    candidate = frame
+                else:
+                    key = (symbol, src, interval)
+                    cached = self._derived.get(key)
+                    if cached is not None and cached[0] == version:
+                        candidate = cached[1]
+                    else:
+                        candidate = resample_klines(frame, src, interval)
+                        self._derived[key] = (version, candidate)
+                window = candidate.tail(limit)
+                if len(window) < limit or ("gap" in window and window["gap"].any()):
+                    continue
+                # Whole candles missing (e.g. two fetches that do not overlap) also count as gaps.
+                if limit > 1 and not (np.diff(window["open_time"].to_numpy()) == interval_ms(interval)).all():
+                    continue
+                record_cache("klines_local", True)
+                return window[COLUMNS].reset_index(drop=True)
+        record_cache("klines_local", False)
+        return None
+
+
+KLINES = KlineCache()
@@ -0,0 +1,413 @@
+"""
+Shared resilience layer for upstream calls (Gemini, Binance).
+
+- Deadlines: every call is bounded by its RetryPolicy deadline and by the enclosing workflow
+  budget (budget()/remaining_budget(), a contextvar, so it follows asyncio tasks and the
+  prefetch threads). No attempt or backoff sleep is started that would overrun either. An
+  attempt whose timeout was shortened by the deadline and then timed out raises
+  DeadlineExceeded and is not counted against the upstream.
+- Retries: only transient failures (timeouts, connection errors, 429/5xx) are retried, with
+  full-jitter exponential backoff.
+- Circuit breakers: one per upstream. After failure_threshold consecutive transient failures the
+  breaker opens and calls fail fast with CircuitOpenError; after reset_timeout_s a single probe is
+  let through (half-open) and its outcome closes or re-opens the breaker. A probe that is
+  cancelled before it finishes gives its slot back.
+- Only real upstream outcomes count: responses (including client errors) close the breaker,
+  transient errors count against it; local errors (bugs in the wrapped call) record nothing.
+- Counters: retries_total, circuit_trips_total, circuit_rejections_total and
+  deadline_exceeded_total per upstream (fallbacks are counted by record_fallback).
+
+FaultInjector is a local stand-in for an upstream (fail first N calls, fail at a rate, add
+latency) so the behaviour can be exercised without network access.
+"""
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tools.telemetry import METRICS
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call or workflow deadline left no time for (another) attempt."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream's circuit breaker is open; the call was not attempted."""
+
+
+# -----------------------------
+# Deadlines
+# -----------------------------
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("workflow_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current workflow budget (None when unbounded)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def budget(seconds: Optional[float]):
+    """
+    Bound the enclosed workflow to seconds (None = unbounded). Nested budgets never extend an outer one.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + float(seconds)
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+# -----------------------------
+# Circuit breakers
+# -----------------------------
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open (fail fast) -> half-open (one probe) -> closed/open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self._opened_at >= self.reset_timeout_s else "open"
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (no probe slot available)."""
+        with self._lock:
+            state = self._state()
+            return state == "open" or (state == "half_open" and self._probing)
+
+    def acquire(self) -> Optional[str]:
+        """
+        Admit a call: "closed" (normal), "probe" (the single half-open trial) or None (rejected).
+        A probe must end in record_success(), record_failure() or release().
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return "closed"
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return "probe"
+        METRICS.inc("circuit_rejections_total", upstream=self.name)
+        return None
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release(self) -> None:
+        """
+        Give the probe slot back without an outcome (the probe was cancelled or abandoned), so the
+        next caller can probe instead of the breaker staying half-open and rejecting forever.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            reopen = self._probing
+            self._probing = False
+            if reopen or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = self._clock()
+                tripped = True
+            else:
+                tripped = False
+        if tripped:
+            METRICS.inc("circuit_trips_total", upstream=self.name)
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream: str, **kwargs: Any) -> CircuitBreaker:
+    """Process-wide breaker per upstream name (kwargs only apply on first creation)."""
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = _breakers[upstream] = CircuitBreaker(upstream, **kwargs)
+        return breaker
+
+
+# -----------------------------
+# Retries
+# -----------------------------
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = 3
+    base_delay_s: float = 0.25
+    max_delay_s: float = 4.0
+    call_timeout_s: Optional[float] = 10.0  # per attempt; None = only the deadlines bound it
+    deadline_s: Optional[float] = None  # across all attempts; None = only the workflow budget
+
+    def backoff(self, retry: int, rng: Callable[[], float] = random.random) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2**retry)]."""
+        return rng() * min(self.max_delay_s, self.base_delay_s * 2**retry)
+
+
+BINANCE_RETRY = RetryPolicy(attempts=3, base_delay_s=0.25, max_delay_s=2.0, call_timeout_s=10.0, deadline_s=15.0)
+# An attempt here is a whole multi-turn agent run: its model calls are bounded one by one by the
+# per-request HTTP timeout (agents.model_call_config), not by a wall clock over the run, so a
+# slow but healthy run is never counted against the model's breaker.
+LLM_RETRY = RetryPolicy(attempts=2, base_delay_s=1.0, max_delay_s=8.0, call_timeout_s=None)
+# Slack for a wait_for capped at the deadline firing a hair early.
+_DEADLINE_SLACK_S = 0.05
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    """HTTP status of an upstream error response, if the exception carries one."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "code", None) or getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    # requests'/httpx' Timeout classes do not derive from the builtin TimeoutError.
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "timeout" in type(exc).__name__.lower()
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Transient failures worth retrying (and counting against the breaker): timeouts, connection
+    errors and 408/425/429/5xx responses. Other client errors mean the upstream is up.
+    """
+    if isinstance(exc, (DeadlineExceeded, CircuitOpenError)):
+        return False
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)) or _is_timeout(exc):
+        return True
+    status = _status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # requests' ConnectionError/Timeout derive from IOError rather than the builtins above.
+    return isinstance(exc, OSError)
+
+
+def is_upstream_error(exc: BaseException) -> bool:
+    """True for failures that reflect on the upstream (transient errors or an error response)."""
+    return is_retryable(exc) or _status(exc) is not None
+
+
+class _Attempts:
+    """
+    Shared bookkeeping for the sync and async retry loops.
+    """
+
+    def __init__(self, upstream: str, policy: RetryPolicy, breaker: Optional[CircuitBreaker]):
+        self.upstream = upstream
+        self.policy = policy
+        self.breaker = breaker if breaker is not None else get_breaker(upstream)
+        self.probe = False
+        self.capped = False
+        call_deadline = time.monotonic() + policy.deadline_s if policy.deadline_s is not None else None
+        workflow_left = remaining_budget()
+        workflow_deadline = time.monotonic() + workflow_left if workflow_left is not None else None
+        bounds = [d for d in (call_deadline, workflow_deadline) if d is not None]
+        self.deadline = min(bounds) if bounds else None
+
+    def left(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def start(self) -> Optional[float]:
+        """Check deadline + breaker before an attempt; returns the attempt timeout."""
+        left = self.left()
+        if left is not None and left <= 0:
+            METRICS.inc("deadline_exceeded_total", upstream=self.upstream)
+            raise DeadlineExceeded(f"{self.upstream}: deadline exceeded")
+        admitted = self.breaker.acquire()
+        if admitted is None:
+            raise CircuitOpenError(f"{self.upstream}: circuit open")
+        self.probe = admitted == "probe"
+        # A timeout on an attempt cut short by the deadline is ours, not the upstream's.
+        limit = self.policy.call_timeout_s
+        self.capped = left is not None and (limit is None or left < limit)
+        return left if self.capped else limit
+
+    def abandoned(self) -> None:
+        """The attempt was interrupted (e.g. cancelled): free a held probe slot, record nothing."""
+        if self.probe:
+            self.breaker.release()
+            self.probe = False
+
+    def failed(self, exc: BaseException, attempt: int) -> float:
+        """Record a failure; re-raise if it should not be retried, else return the backoff delay."""
+        left = self.left()
+        if self.capped and _is_timeout(exc) and left is not None and left <= _DEADLINE_SLACK_S:
+            # The deadline, not the upstream, ended this attempt: leave the breaker (and the
+            # caller's health stats) alone and surface it as DeadlineExceeded.
+            self.abandoned()
+            METRICS.inc("deadline_exceeded_total", upstream=self.upstream)
+            raise DeadlineExceeded(f"{self.upstream}: deadline exceeded") from exc
+        if not is_retryable(exc):
+            if _status(exc) is not None:
+                # The upstream answered (e.g. 400 bad symbol): not its fault, keep the breaker closed.
+                self.breaker.record_success()
+            else:
+                # A local error (bug, bad arguments) says nothing about the upstream's health.
+                self.abandoned()
+            raise exc
+        self.breaker.record_failure()
+        delay = self.policy.backoff(attempt)
+        if attempt + 1 >= self.policy.attempts or (left is not None and delay >= left):
+            raise exc
+        METRICS.inc("retries_total", upstream=self.upstream)
+        return delay
+
+
+def call_with_retry(
+    upstream: str,
+    fn: Callable[..., Any],
+    *args: Any,
+    policy: RetryPolicy = BINANCE_RETRY,
+    breaker: Optional[CircuitBreaker] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    **kwargs: Any,
+) -> Any:
+    """
+    Call fn(*args, timeout=<seconds>, **kwargs) under upstream's breaker with deadline-bounded,
+    jittered retries. fn must honour the timeout (e.g. requests.get).
+    """
+    attempts = _Attempts(upstream, policy, breaker)
+    for attempt in range(policy.attempts):
+        timeout = attempts.start()
+        try:
+            result = fn(*args, timeout=timeout, **kwargs)
+        except Exception as e:
+            sleep(attempts.failed(e, attempt))
+            continue
+        except BaseException:
+            attempts.abandoned()
+            raise
+        attempts.breaker.record_success()
+        return result
+    raise RuntimeError("unreachable")
+
+
+async def acall_with_retry(
+    upstream: str,
+    fn: Callable[..., Awaitable[Any]],
+    *args: Any,
+    policy: RetryPolicy = LLM_RETRY,
+    breaker: Optional[CircuitBreaker] = None,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    **kwargs: Any,
+) -> Any:
+    """
+    Async variant: each attempt of fn(*args, **kwargs) is cancelled at its timeout.
+    """
+    attempts = _Attempts(upstream, policy, breaker)
+    for attempt in range(policy.attempts):
+        timeout = attempts.start()
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), timeout=timeout)
+        except Exception as e:
+            await sleep(attempts.failed(e, attempt))
+            continue
+        except BaseException:
+            # Cancellation (outer wait_for, cancelled workflow task) must not strand a probe slot.
+            attempts.abandoned()
+            raise
+        attempts.breaker.record_success()
+        return result
+    raise RuntimeError("unreachable")
+
+
+# -----------------------------
+# Fault injection (local stand-in upstreams)
+# -----------------------------
+
+
+class FaultInjector:
+    """
+    Wrap a (sync or async) callable as a misbehaving upstream: the first fail_first calls raise
+    error, later calls fail with probability fail_rate, and every call takes latency_s (raising
+    TimeoutError when that exceeds the caller's timeout= argument). Counts calls in .calls.
+
+        flaky = FaultInjector(lambda **kw: {"ok": True}, fail_first=2)
+        call_with_retry("test", flaky)  # two retries, then {"ok": True}
+    """
+
+    def __init__(
+        self,
+        fn: Optional[Callable[..., Any]] = None,
+        fail_first: int = 0,
+        fail_rate: float = 0.0,
+        latency_s: float = 0.0,
+        error: Optional[BaseException] = None,
+        seed: Optional[int] = None,
+    ):
+        self.fn = fn or (lambda *args, **kwargs: None)
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.latency_s = latency_s
+        self.error = error or ConnectionError("injected fault")
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.calls += 1
+            return self.calls <= self.fail_first or self._rng.random() < self.fail_rate
+
+    def __call__(self, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        if inspect.iscoroutinefunction(self.fn):
+            return self._acall(*args, **kwargs)
+        fail = self._should_fail()
+        if timeout is not None and self.latency_s > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("injected latency exceeded timeout")
+        time.sleep(self.latency_s)
+        if fail:
+            raise self.error
+        return self.fn(*args, **kwargs)
+
+    async def _acall(self, *args: Any, **kwargs: Any) -> Any:
+        fail = self._should_fail()
+        await asyncio.sleep(self.latency_s)
+        if fail:
+            raise self.error
+        return await self.fn(*args, **kwargs)
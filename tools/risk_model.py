@@ -0,0 +1,387 @@
+"""
+Cached multi-symbol risk model: EWMA return covariance + parametric portfolio VaR/CVaR.
+
+The covariance is RiskMetrics-style (zero-mean log returns, decay lambda) kept as a
+weighted sum so new bars fold in incrementally:
+    cov = (lambda^T * W_old * cov_old + sum_t lambda^(T-t) r_t r_t') / (lambda^T * W_old + sum_t lambda^(T-t))
+Close history is cached per symbol, so adding a symbol fetches only that symbol and rebuilds
+the matrix for the union from cache; otherwise calls within REFRESH_TTL_S are answered from
+cached state. Fetches run outside the model lock, and at most MAX_TRACKED_SYMBOLS histories
+are kept (least recently requested evicted first). Only closed candles are folded in (the live
+candle's close is not final), and a symbol is only tracked if it shares at least
+MIN_OVERLAP_RETURNS returns with the others; symbols that would shrink the common sample below
+that are reported as missing. Candidate TradePlans are scored against existing holdings in one
+shot: each plan only changes one weight, so sigma^2(h + d e_i) = h'Sh + 2 d (Sh)_i + d^2 S_ii.
+"""
+import threading
+import time
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from tools.resample import interval_ms
+from tools.telemetry import record_cache, traced_tool
+
+DEFAULT_DECAY = 0.94
+DEFAULT_INTERVAL = "1d"
+DEFAULT_LOOKBACK = 365
+REFRESH_TTL_S = 300.0
+MIN_OVERLAP_RETURNS = 20
+MAX_TRACKED_SYMBOLS = 64
+EXTEND_BARS = 50
+
+
+def _fetch_closes(symbols: Sequence[str], interval: str, limit: int) -> pd.DataFrame:
+    """
+    Close prices pivoted to timestamp x symbol (live klines with local fallback).
+    """
+    from tools.data_tools import fetch_binance_spot_klines
+
+    frames = []
+    for symbol in symbols:
+        rows = fetch_binance_spot_klines(symbol, interval=interval, limit=limit).get("rows", [])
+        if rows:
+            df = pd.DataFrame(rows)[["timestamp", "close"]].assign(symbol=symbol)
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    closes = pd.concat(frames).pivot_table(index="timestamp", columns="symbol", values="close", aggfunc="last")
+    return closes.sort_index()
+
+
+def _closed_only(closes: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Drop candles still open at the current time (open_time + interval > now, UTC).
+    """
+    if closes.empty:
+        return closes
+    ts = pd.DatetimeIndex(closes.index)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    now = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    return closes[ts + pd.Timedelta(milliseconds=interval_ms(interval)) <= now]
+
+
+class RiskModel:
+    """
+    EWMA covariance over tracked symbols, refreshed lazily and extended incrementally.
+    """
+
+    def __init__(
+        self,
+        interval: str = DEFAULT_INTERVAL,
+        lookback: int = DEFAULT_LOOKBACK,
+        decay: float = DEFAULT_DECAY,
+        ttl_s: float = REFRESH_TTL_S,
+        fetch=_fetch_closes,
+        max_symbols: int = MAX_TRACKED_SYMBOLS,
+    ):
+        self.interval = interval
+        self.lookback = lookback
+        self.decay = decay
+        self.ttl_s = ttl_s
+        self.max_symbols = max_symbols
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self.symbols: List[str] = []
+        self.cov = np.zeros((0, 0))
+        self.weight_sum = 0.0
+        self.last_ts: Optional[pd.Timestamp] = None
+        self.last_close = np.zeros(0)
+        self.refreshed_at = 0.0
+        self._unavailable: Dict[str, float] = {}
+        # symbol -> closed closes (at most lookback + 1), least recently requested first.
+        self._history: "OrderedDict[str, pd.Series]" = OrderedDict()
+
+    def _fold(self, returns: np.ndarray) -> None:
+        """
+        Fold a (T x n) block of returns into the running EWMA covariance.
+        """
+        if len(returns) == 0:
+            return
+        steps = len(returns)
+        weights = self.decay ** np.arange(steps - 1, -1, -1)
+        block = (returns * weights[:, None]).T @ returns
+        carry = self.decay**steps * self.weight_sum
+        total = carry + weights.sum()
+        self.cov = (carry * self.cov + block) / total
+        self.weight_sum = total
+
+    def _store(self, closes: pd.DataFrame) -> None:
+        """
+        Merge fetched closes into the per-symbol history (newer values win).
+        """
+        for symbol in closes.columns:
+            series = closes[symbol].dropna()
+            previous = self._history.get(symbol)
+            if previous is not None:
+                series = pd.concat([previous, series])
+                series = series[~series.index.duplicated(keep="last")].sort_index()
+            self._history[symbol] = series.tail(self.lookback + 1)
+            self._history.move_to_end(symbol)
+
+    def _evict(self, keep: Sequence[str]) -> None:
+        """
+        Drop the least recently requested histories beyond max_symbols (never ones in keep);
+        histories of untracked symbols (too little overlap) go before tracked ones.
+        """
+        candidates = [s for s in self._history if s not in keep]
+        candidates.sort(key=lambda s: s in self.symbols)  # stable: LRU order within each class
+        for symbol in candidates:
+            if len(self._history) <= self.max_symbols:
+                break
+            del self._history[symbol]
+
+    def _frame(self, symbols: Sequence[str]) -> pd.DataFrame:
+        return pd.DataFrame({s: self._history[s] for s in symbols if s in self._history}).sort_index()
+
+    def _overlapping(self, closes: pd.DataFrame, symbols: List[str]) -> List[str]:
+        """
+        Largest greedy set of symbols whose common sample keeps MIN_OVERLAP_RETURNS returns.
+        Already tracked symbols go first so a new, non-overlapping one cannot evict them.
+        """
+        counts = closes.notna().sum()
+        order = sorted(
+            (s for s in symbols if s in closes.columns), key=lambda s: (s not in self.symbols, -int(counts[s]))
+        )
+        chosen: List[str] = []
+        for symbol in order:
+            if len(closes[chosen + [symbol]].dropna()) - 1 >= MIN_OVERLAP_RETURNS:
+                chosen.append(symbol)
+        return [s for s in symbols if s in chosen]
+
+    def _rebuild(self, symbols: List[str]) -> None:
+        """
+        Recompute the covariance for symbols from cached history (no fetching).
+        """
+        closes = self._frame(symbols)
+        available = self._overlapping(closes, symbols)
+        now = time.monotonic()
+        self._unavailable.update({s: now for s in symbols if s not in available})
+        # Common sample across symbols: history is truncated to the shortest overlapping series.
+        closes = closes[available].dropna()
+        self.symbols = available
+        self.cov = np.zeros((len(available), len(available)))
+        self.weight_sum = 0.0
+        self.last_ts, self.last_close = None, np.zeros(0)
+        if available:
+            values = closes.to_numpy(dtype=float)
+            self._fold(np.diff(np.log(values), axis=0))
+            self.last_ts = closes.index[-1]
+            self.last_close = values[-1]
+
+    def _extend(self) -> None:
+        """
+        Fold closes newer than last_ts (already merged into history) into the covariance.
+        """
+        closes = self._frame(self.symbols)
+        if self.last_ts is None or not set(self.symbols) <= set(closes.columns):
+            return
+        if self.last_ts not in closes.index:
+            self._rebuild(self.symbols)
+            return
+        new = closes.loc[closes.index > self.last_ts, self.symbols].dropna()
+        if len(new):
+            values = np.vstack([self.last_close, new.to_numpy(dtype=float)])
+            self._fold(np.diff(np.log(values), axis=0))
+            self.last_ts = new.index[-1]
+            self.last_close = values[-1]
+
+    def ensure(self, symbols: Sequence[str]) -> None:
+        """
+        Make sure symbols are tracked and the state is fresh: fetch full history only for symbols
+        not tracked yet, a short tail for tracked ones once the TTL has passed. Network calls run
+        without holding the lock, so concurrent readers are served from the current state.
+        """
+        wanted = sorted({s.upper() for s in symbols} - {""})
+        with self._lock:
+            now = time.monotonic()
+            for symbol in wanted:
+                if symbol in self._history:
+                    self._history.move_to_end(symbol)
+            missing = [
+                s for s in wanted if s not in self.symbols and now - self._unavailable.get(s, -self.ttl_s) >= self.ttl_s
+            ]
+            stale = bool(self.symbols) and now - self.refreshed_at > self.ttl_s
+            tracked = list(self.symbols)
+        if not missing and not stale:
+            record_cache("risk_model", True)
+            return
+        record_cache("risk_model", False)
+
+        fresh = _closed_only(self._fetch(missing, self.interval, self.lookback), self.interval) if missing else pd.DataFrame()
+        tail = _closed_only(self._fetch(tracked, self.interval, EXTEND_BARS), self.interval) if stale else pd.DataFrame()
+
+        with self._lock:
+            now = time.monotonic()
+            self._unavailable.update({s: now for s in missing if s not in fresh.columns})
+            self._store(tail)
+            self._store(fresh)
+            self._evict(keep=wanted)
+            target = [s for s in sorted(set(self.symbols) | set(wanted)) if s in self._history]
+            if target != self.symbols:
+                self._rebuild(target)
+            elif stale:
+                self._extend()
+            if stale or not tracked:
+                self.refreshed_at = now
+
+    def covariance(self, symbols: Sequence[str]) -> pd.DataFrame:
+        """
+        Sub-matrix for the requested symbols that have data (call ensure() first).
+        """
+        with self._lock:
+            index = {s: i for i, s in enumerate(self.symbols)}
+            keep = [s.upper() for s in symbols if s.upper() in index]
+            idx = [index[s] for s in keep]
+            return pd.DataFrame(self.cov[np.ix_(idx, idx)], index=keep, columns=keep)
+
+
+def _var_cvar(sigma: np.ndarray, confidence: float, horizon_days: float) -> Dict[str, np.ndarray]:
+    dist = NormalDist()
+    z = dist.inv_cdf(confidence)
+    scaled = sigma * np.sqrt(horizon_days)
+    return {"var": z * scaled, "cvar": scaled * dist.pdf(z) / (1 - confidence)}
+
+
+def portfolio_risk(
+    cov: pd.DataFrame,
+    holdings: Dict[str, float],
+    plans: List[Dict[str, Any]],
+    confidence: float = 0.95,
+    horizon_days: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    VaR/CVaR (as % of portfolio) for holdings alone, holdings + each plan, and holdings + all plans.
+    holdings: symbol -> signed weight (fraction of portfolio). plans need symbol, side, size_pct.
+    """
+    symbols = list(cov.columns)
+    pos = {s: i for i, s in enumerate(symbols)}
+    S = cov.to_numpy()
+    h = np.zeros(len(symbols))
+    for symbol, weight in holdings.items():
+        if symbol.upper() in pos:
+            h[pos[symbol.upper()]] += float(weight)
+
+    plan_idx, plan_delta, skipped = [], [], set()
+    for i, plan in enumerate(plans):
+        symbol = str(plan.get("symbol", "")).upper()
+        if symbol not in pos:
+            skipped.add(i)
+            continue
+        sign = -1.0 if str(plan.get("side", "buy")).lower() in {"sell", "short"} else 1.0
+        plan_idx.append(pos[symbol])
+        plan_delta.append(sign * float(plan.get("size_pct") or 0) / 100)
+    plan_idx = np.array(plan_idx, dtype=int)
+    plan_delta = np.array(plan_delta, dtype=float)
+
+    Sh = S @ h
+    base_var = float(h @ Sh)
+    # Every plan at once: sigma^2 = h'Sh + 2 d (Sh)_i + d^2 S_ii
+    per_plan_var = base_var + 2 * plan_delta * Sh[plan_idx] + plan_delta**2 * S[plan_idx, plan_idx]
+    combined = h.copy()
+    np.add.at(combined, plan_idx, plan_delta)
+    Sc = S @ combined
+    combined_sigma = float(np.sqrt(max(combined @ Sc, 0.0)))
+
+    base = _var_cvar(np.array([np.sqrt(max(base_var, 0.0))]), confidence, horizon_days)
+    each = _var_cvar(np.sqrt(np.maximum(per_plan_var, 0.0)), confidence, horizon_days)
+    total = _var_cvar(np.array([combined_sigma]), confidence, horizon_days)
+    # Component contributions to combined sigma (sum to sigma); marginal = dSigma/dw.
+    marginal = Sc / combined_sigma if combined_sigma > 0 else np.zeros_like(Sc)
+    component = combined * marginal
+
+    plans_out = []
+    used = iter(range(len(plan_idx)))
+    for i, plan in enumerate(plans):
+        if i in skipped:
+            plans_out.append({"plan_index": i, "symbol": plan.get("symbol"), "status": "no_data"})
+            continue
+        k = next(used)
+        plans_out.append(
+            {
+                "plan_index": i,
+                "symbol": symbols[plan_idx[k]],
+                "var_pct": round(float(each["var"][k]) * 100, 4),
+                "cvar_pct": round(float(each["cvar"][k]) * 100, 4),
+                "incremental_var_pct": round(float(each["var"][k] - base["var"][0]) * 100, 4),
+            }
+        )
+    vol = np.sqrt(np.diag(S))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where(np.outer(vol, vol) > 0, S / np.outer(vol, vol), 0.0)
+    return {
+        "confidence": confidence,
+        "horizon_days": horizon_days,
+        "holdings": {"var_pct": round(float(base["var"][0]) * 100, 4), "cvar_pct": round(float(base["cvar"][0]) * 100, 4)},
+        "combined": {
+            "var_pct": round(float(total["var"][0]) * 100, 4),
+            "cvar_pct": round(float(total["cvar"][0]) * 100, 4),
+            "volatility_pct": round(combined_sigma * 100, 4),
+        },
+        "plans": plans_out,
+        "risk_contributions": {
+            s: {"weight": round(float(combined[i]), 6), "marginal": round(float(marginal[i]), 6), "component_pct": round(float(component[i]) * 100, 4)}
+            for i, s in enumerate(symbols)
+            if combined[i] != 0
+        },
+        "correlation": {s: {t: round(float(corr[i, j]), 3) for j, t in enumerate(symbols)} for i, s in enumerate(symbols)},
+    }
+
+
+_models: Dict[str, RiskModel] = {}
+_models_lock = threading.Lock()
+
+
+def get_risk_model(interval: str = DEFAULT_INTERVAL) -> RiskModel:
+    """Process-wide risk model per kline interval."""
+    with _models_lock:
+        model = _models.get(interval)
+        if model is None:
+            model = _models[interval] = RiskModel(interval=interval)
+        return model
+
+
+@traced_tool
+def assess_portfolio_risk(
+    trade_plans: List[Dict[str, Any]],
+    holdings: Optional[Dict[str, float]] = None,
+    address: Optional[str] = None,
+    confidence: float = 0.95,
+    horizon_days: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Portfolio-level risk for proposed TradePlans (symbol, side, size_pct) together with existing
+    holdings, using a cached EWMA covariance of daily returns.
+
+    holdings: optional {symbol: weight_pct} of the current portfolio; or pass address to use the
+    wallet's current exposure from the position engine.
+
+    Returns VaR/CVaR (% of portfolio) for holdings, each plan added alone (with incremental VaR),
+    and all plans combined, plus per-symbol risk contributions and the correlation matrix.
+    Symbols without enough overlapping history are listed in missing_symbols; if none has any,
+    status is "insufficient_data" and no VaR is reported.
+    """
+    weights = {s.upper(): float(w) / 100 for s, w in (holdings or {}).items()}
+    if address:
+        from tools.positions import compute_positions
+
+        for row in compute_positions(address=address)["exposure"]:
+            if row.get("weight"):
+                weights[row["symbol"]] = weights.get(row["symbol"], 0.0) + float(row["weight"])
+    symbols = sorted(set(weights) | {str(p.get("symbol", "")).upper() for p in trade_plans} - {""})
+    model = get_risk_model()
+    model.ensure(symbols)
+    cov = model.covariance(symbols)
+    if cov.empty:
+        return {
+            "status": "insufficient_data",
+            "error": f"fewer than {MIN_OVERLAP_RETURNS} overlapping closed {model.interval} returns",
+            "missing_symbols": symbols,
+        }
+    result = portfolio_risk(cov, weights, trade_plans, confidence=confidence, horizon_days=horizon_days)
+    result["missing_symbols"] = [s for s in symbols if s not in cov.columns]
+    return result
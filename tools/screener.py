@@ -0,0 +1,132 @@
+"""
+Deterministic universe pre-screen for the SearchAgent.
+
+One all-symbols 24h ticker request covers the whole exchange; every symbol is then scored
+in a single vectorized pass on return, intraday range (volatility proxy), quote volume and
+bid/ask spread. The ranked table is cached for SCREEN_TTL_S so concurrent workflows share it,
+and only the top-k rows (with their stats) are handed to the LLM.
+Offline (USE_BINANCE_LIVE=0 or upstream error) the same stats are derived from local OHLCV.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.telemetry import record_cache, record_fallback, traced_tool
+
+SCREEN_TTL_S = 60.0
+DEFAULT_TOP_K = 10
+# Relative weights of the percentile-ranked factors (spread counts against a symbol).
+SCORE_WEIGHTS = {"abs_return": 0.35, "range": 0.20, "liquidity": 0.30, "spread": 0.15}
+
+_cache: Dict[str, Tuple[float, pd.DataFrame, str]] = {}
+_cache_lock = threading.Lock()
+
+
+def _from_ticker(payload: list) -> pd.DataFrame:
+    df = pd.DataFrame(payload)
+    cols = ["lastPrice", "priceChangePercent", "highPrice", "lowPrice", "quoteVolume", "bidPrice", "askPrice"]
+    df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    mid = (df["bidPrice"] + df["askPrice"]) / 2
+    return pd.DataFrame(
+        {
+            "symbol": df["symbol"],
+            "last_price": df["lastPrice"],
+            "return_pct": df["priceChangePercent"],
+            "range_pct": (df["highPrice"] - df["lowPrice"]) / df["lastPrice"] * 100,
+            "quote_volume": df["quoteVolume"],
+            "spread_bps": ((df["askPrice"] - df["bidPrice"]) / mid * 1e4).where(mid > 0),
+        }
+    )
+
+
+def _from_local() -> pd.DataFrame:
+    from tools.stores import get_price_store
+
+    prices = get_price_store().frame
+    if prices.empty:
+        return pd.DataFrame(columns=["symbol", "last_price", "return_pct", "range_pct", "quote_volume", "spread_bps"])
+    grouped = prices.groupby("symbol")
+    last, prev = grouped.nth(-1).set_index("symbol"), grouped.nth(-2).set_index("symbol")
+    out = pd.DataFrame({"last_price": last["close"]})
+    out["return_pct"] = (last["close"] / prev["close"].reindex(out.index) - 1) * 100
+    out["range_pct"] = (last["high"] - last["low"]) / last["close"] * 100
+    out["quote_volume"] = last["volume"] * last["close"]
+    out["spread_bps"] = np.nan
+    return out.reset_index()
+
+
+def score_universe(stats: pd.DataFrame, weights: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Rank symbols by a weighted blend of percentile ranks; returns stats sorted by score (desc).
+    Missing factors (e.g. no spread offline) score neutral (0.5).
+    """
+    weights = weights or SCORE_WEIGHTS
+    if stats.empty:
+        return stats.assign(score=[], rank=[])
+    factors = pd.DataFrame(
+        {
+            "abs_return": stats["return_pct"].abs(),
+            "range": stats["range_pct"],
+            "liquidity": np.log1p(stats["quote_volume"].clip(lower=0)),
+            "spread": -stats["spread_bps"],
+        }
+    )
+    ranks = factors.rank(pct=True).fillna(0.5)
+    score = sum(ranks[name] * w for name, w in weights.items()) / sum(weights.values())
+    out = stats.assign(score=score.round(4)).sort_values("score", ascending=False, kind="mergesort")
+    return out.assign(rank=np.arange(1, len(out) + 1)).reset_index(drop=True)
+
+
+def ranked_universe(quote_asset: str = "USDT") -> Tuple[pd.DataFrame, str]:
+    """
+    Scored table for every symbol quoted in quote_asset, cached for SCREEN_TTL_S.
+    Returns (table, source) where source is "binance" or "local".
+    """
+    from tools.data_tools import fetch_binance_24h
+
+    key = quote_asset.upper()
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and now - cached[0] < SCREEN_TTL_S:
+        record_cache("screener", True)
+        return cached[1], cached[2]
+    record_cache("screener", False)
+
+    payload = fetch_binance_24h()
+    if isinstance(payload, list) and payload:
+        stats, source = _from_ticker(payload), "binance"
+        if key:
+            stats = stats[stats["symbol"].str.endswith(key)]
+    else:
+        record_fallback("binance_24h_all", reason=payload.get("status", "error") if isinstance(payload, dict) else "empty")
+        stats, source = _from_local(), "local"
+    stats = stats[stats["last_price"] > 0]
+    table = score_universe(stats)
+    with _cache_lock:
+        _cache[key] = (now, table, source)
+    return table, source
+
+
+@traced_tool
+def screen_universe(top_k: int = DEFAULT_TOP_K, quote_asset: str = "USDT", min_quote_volume: float = 1_000_000) -> Dict[str, Any]:
+    """
+    Pre-screen the whole spot universe in one request and return the top_k symbols by score
+    (abs 24h return, intraday range, quote volume, tight spread) with their stats.
+    min_quote_volume filters illiquid pairs (ignored for the offline sample data).
+    """
+    table, source = ranked_universe(quote_asset)
+    universe = len(table)
+    if source == "binance" and min_quote_volume:
+        table = table[table["quote_volume"] >= min_quote_volume]
+    top = table.head(max(1, int(top_k))).round(4)
+    return {
+        "source": source,
+        "as_of": datetime.utcnow().isoformat() + "Z",
+        "universe_size": universe,
+        "candidates": top.astype(object).where(top.notna(), None).to_dict(orient="records"),
+    }
@@ -0,0 +1,332 @@
+"""
+Shared in-process stores for the local price/trade CSVs.
+
+Each CSV is parsed once (and re-parsed only when the file changes), sorted by its key
+and timestamp, and indexed so a (key, date range) lookup is two binary searches instead
+of a full scan. Pages are addressed with opaque cursors tied to the store version and to
+the query they were issued for, so a client paging through a long history gets bounded
+responses and a clear error if the underlying data changed mid-scan or the cursor is
+replayed against different parameters. A reload that only appended rows to the file is
+recorded, so incremental readers (the position book) can pick up just the new rows.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.telemetry import record_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEFAULT_PAGE_SIZE = 100
+# Append-only ancestors remembered per snapshot (readers further behind start over).
+MAX_LINEAGE = 32
+MAX_PAGE_SIZE = 1000
+
+
+class StaleCursorError(ValueError):
+    """Raised when a cursor was issued against an older version of the store."""
+
+
+def query_hash(**params: Any) -> str:
+    """
+    Short, order-independent fingerprint of the query parameters a cursor belongs to.
+    """
+    raw = json.dumps({k: v for k, v in params.items() if v is not None}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(offset: int, version: int, query: str = "") -> str:
+    raw = json.dumps({"o": offset, "v": version, "q": query}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], version: int, query: str = "") -> int:
+    if not cursor:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset, cursor_version = int(payload["o"]), int(payload["v"])
+        cursor_query = str(payload.get("q", ""))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if cursor_query != query:
+        raise ValueError("Cursor was issued for a different query; pass the same parameters or restart pagination.")
+    if cursor_version != version:
+        raise StaleCursorError("Data changed since this cursor was issued; restart pagination.")
+    return max(offset, 0)
+
+
+def paginate(df: pd.DataFrame, version: int, query: str, cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    One page of an already-selected frame, with a cursor bound to (version, query).
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    offset = decode_cursor(cursor, version, query)
+    rows = df.iloc[offset : offset + limit]
+    next_offset = offset + len(rows)
+    return {
+        "rows": records(rows),
+        "total": len(df),
+        "next_cursor": encode_cursor(next_offset, version, query) if next_offset < len(df) else None,
+    }
+
+
+def _naive_utc(value: Any) -> np.datetime64:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_datetime64()
+
+
+def records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    JSON-friendly rows (timestamps as ISO strings).
+    """
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].map(lambda t: t.isoformat())
+    return out.to_dict(orient="records")
+
+
+class _Snapshot:
+    """Immutable view of one loaded CSV version (swapped atomically on reload)."""
+
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        ranges: Dict[str, Tuple[int, int]],
+        version: int,
+        lineage: Optional[Dict[int, int]] = None,
+    ):
+        self.frame = frame
+        self.ranges = ranges
+        self.version = version
+        # Earlier version -> its row count, for every version this one only appended rows to.
+        self.lineage = lineage or {}
+        ts = frame["timestamp"]
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        self.ts = ts.to_numpy(dtype="datetime64[ns]")
+
+    def bounds(self, key: Optional[str], start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+        if key is None:
+            lo, hi = 0, len(self.frame)
+        else:
+            lo, hi = self.ranges.get(key.lower(), (0, 0))
+        if start and hi > lo:
+            lo += int(np.searchsorted(self.ts[lo:hi], _naive_utc(start), side="left"))
+        if end and hi > lo:
+            hi = lo + int(np.searchsorted(self.ts[lo:hi], _naive_utc(end), side="right"))
+        return lo, hi
+
+    def rows(self, lo: int, hi: int) -> pd.DataFrame:
+        return self.frame.iloc[lo:hi].drop(columns=["_key", "_row"])
+
+
+class IndexedCsvStore:
+    """
+    Loads a CSV sorted by (key, timestamp) and keeps per-key [start, end) row ranges.
+    """
+
+    def __init__(self, path: str, key_column: str):
+        self.path = path
+        self.key_column = key_column
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._snapshot: Optional[_Snapshot] = None
+        # Size and digest of the last loaded file, to tell an append from an edit on reload.
+        self._raw_size = 0
+        self._raw_digest = b""
+
+    def _load(self) -> _Snapshot:
+        cache_name = f"store:{os.path.basename(self.path)}"
+        mtime = os.path.getmtime(self.path)
+        snapshot = self._snapshot
+        if snapshot is not None and mtime == self._mtime:
+            record_cache(cache_name, True)
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and mtime == self._mtime:
+                return self._snapshot
+            record_cache(cache_name, False)
+            with open(self.path, "rb") as fh:
+                raw = fh.read()
+            previous = self._snapshot
+            appended = (
+                previous is not None
+                and len(raw) >= self._raw_size
+                and raw[: self._raw_size].endswith(b"\n")
+                and hashlib.sha256(raw[: self._raw_size]).digest() == self._raw_digest
+            )
+            lineage = {**previous.lineage, previous.version: len(previous.frame)} if appended else {}
+            lineage = dict(list(lineage.items())[-MAX_LINEAGE:])
+            df = pd.read_csv(io.BytesIO(raw), parse_dates=["timestamp"])
+            df["_row"] = np.arange(len(df))
+            df["_key"] = df[self.key_column].astype(str).str.lower()
+            df = df.sort_values(["_key", "timestamp"], kind="mergesort").reset_index(drop=True)
+            keys = df["_key"].to_numpy()
+            ranges = {}
+            if len(keys):
+                boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+                starts = np.concatenate(([0], boundaries))
+                ends = np.concatenate((boundaries, [len(keys)]))
+                ranges = {keys[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+            version = (self._snapshot.version + 1) if self._snapshot else 1
+            self._snapshot = _Snapshot(df, ranges, version, lineage)
+            self._mtime = mtime
+            self._raw_size, self._raw_digest = len(raw), hashlib.sha256(raw).digest()
+            return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._load().version
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """
+        Full sorted frame (without the internal index column). Treat as read-only.
+        """
+        snap = self._load()
+        return snap.rows(0, len(snap.frame))
+
+    def rows_since(self, version: Optional[int], offset: int) -> Tuple[Optional[pd.DataFrame], int, int]:
+        """
+        Rows appended to the file since a reader saw (version, offset rows), in file order, plus the
+        current version and row count. The frame is None when the file was not only appended to
+        since then (edited, truncated, unknown version): the reader must start over from select().
+        """
+        snap = self._load()
+        total = len(snap.frame)
+        if version == snap.version:
+            base = offset
+        elif version in snap.lineage:
+            base = snap.lineage[version]
+        else:
+            return None, snap.version, total
+        if base != offset:
+            return None, snap.version, total
+        new = snap.frame[snap.frame["_row"].to_numpy() >= offset].sort_values("_row", kind="mergesort")
+        return new.drop(columns=["_key", "_row"]), snap.version, total
+
+    def keys(self) -> List[str]:
+        return list(self._load().ranges)
+
+    @staticmethod
+    def _select(snap: _Snapshot, key: Optional[str], start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        if key is None and (start or end):
+            # Rows are only time-sorted within a key; fall back to a mask across keys.
+            mask = np.ones(len(snap.ts), dtype=bool)
+            if start:
+                mask &= snap.ts >= _naive_utc(start)
+            if end:
+                mask &= snap.ts <= _naive_utc(end)
+            return snap.rows(0, len(snap.frame))[mask]
+        return snap.rows(*snap.bounds(key, start, end))
+
+    def select(self, key: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        All rows for one key (or every key) within [start, end], sorted by timestamp per key.
+        """
+        return self._select(self._load(), key, start, end)
+
+    def select_versioned(
+        self, key: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        select() plus the version of the snapshot the rows came from (for issuing cursors).
+        """
+        snap = self._load()
+        return self._select(snap, key, start, end), snap.version
+
+    def page(
+        self,
+        key: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        One bounded page of rows plus next_cursor (None when exhausted).
+        Pass the same key/start/end with the returned cursor to continue.
+        """
+        snap = self._load()
+        query = query_hash(key=key.lower() if key else None, start=start, end=end)
+        if key is None:
+            return paginate(self._select(snap, None, start, end), snap.version, query, cursor, limit)
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        offset = decode_cursor(cursor, snap.version, query)
+        lo, hi = snap.bounds(key, start, end)
+        rows = snap.rows(min(lo + offset, hi), min(lo + offset + limit, hi))
+        total = hi - lo
+        next_offset = offset + len(rows)
+        return {
+            "rows": records(rows),
+            "total": total,
+            "next_cursor": encode_cursor(next_offset, snap.version, query) if next_offset < total else None,
+        }
+
+
+_stores: Dict[str, IndexedCsvStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(filename: str, key_column: str) -> IndexedCsvStore:
+    with _stores_lock:
+        store = _stores.get(filename)
+        if store is None:
+            store = _stores[filename] = IndexedCsvStore(os.path.join(DATA_DIR, filename), key_column)
+        return store
+
+
+def get_price_store() -> IndexedCsvStore:
+    """Process-wide OHLCV store keyed by symbol."""
+    return _get_store("prices.csv", "symbol")
+
+
+def get_trade_store() -> IndexedCsvStore:
+    """Process-wide trade store keyed by address."""
+    return _get_store("trades.csv", "address")
+
+
+def downsample_ohlcv(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    Aggregate OHLCV rows per symbol into coarser buckets (pandas offset alias, e.g. '1D', '1W').
+    """
+    if df.empty:
+        return df
+    agg = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    out = (
+        df.set_index("timestamp")
+        .groupby("symbol")
+        .resample(rule)
+        .agg(agg)
+        .dropna(subset=["open"])
+        .reset_index()
+    )
+    return out[["timestamp", "symbol", "open", "high", "low", "close", "volume"]]
+
+
+def aggregate_trades(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Per (symbol, side) counts, quantity, notional and VWAP.
+    """
+    if df.empty:
+        return []
+    df = df.assign(side=df["side"].str.lower(), notional=df["quantity"] * df["price"])
+    grouped = df.groupby(["symbol", "side"]).agg(
+        num_trades=("price", "size"),
+        quantity=("quantity", "sum"),
+        notional=("notional", "sum"),
+        first_trade=("timestamp", "min"),
+        last_trade=("timestamp", "max"),
+    )
+    grouped["vwap"] = grouped["notional"] / grouped["quantity"].where(grouped["quantity"] != 0)
+    return records(grouped.reset_index())
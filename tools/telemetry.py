@@ -0,0 +1,236 @@
+"""
+Built-in tracing and metrics for workflows, agent (LLM) calls and tool calls.
+
+- span(): nested timing spans (workflow -> idea -> stage -> llm/tool), exported as JSONL
+  when TRACE_FILE is set (e.g. TRACE_FILE=logs/trace.jsonl).
+- METRICS: in-process counters + latency histograms, rendered in Prometheus text format
+  and served on /metrics by the A2A service entry points (see mount_metrics).
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+METRIC_PREFIX = "copilot_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+_trace_lock = threading.Lock()
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms keyed by (name, labels).
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Dict[str, Any]]] = {}
+
+    def inc(self, metric: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, metric: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def counter_value(self, metric: str, **labels: Any) -> float:
+        with self._lock:
+            return self._counters.get(metric, {}).get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON-friendly dump of all series (used by evaluations and debugging).
+        """
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {"labels": dict(k), "count": h["count"], "sum": round(h["sum"], 6)}
+                    for k, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = METRIC_PREFIX + name
+                lines.append(f"# TYPE {full} counter")
+                for key, value in series.items():
+                    lines.append(f"{full}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                full = METRIC_PREFIX + name
+                lines.append(f"# TYPE {full} histogram")
+                for key, hist in series.items():
+                    # bucket counts are already cumulative (observe() fills every bucket >= value)
+                    for bound, count in zip(self.buckets, hist["buckets"]):
+                        lines.append(f"{full}_bucket{_format_labels(key, {'le': str(bound)})} {count}")
+                    lines.append(f"{full}_bucket{_format_labels(key, {'le': '+Inf'})} {hist['count']}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {hist['sum']}")
+                    lines.append(f"{full}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+METRICS = MetricsRegistry()
+
+
+def _export_span(record: Dict[str, Any]) -> None:
+    path = os.getenv("TRACE_FILE")
+    if not path:
+        return
+    line = json.dumps(record, default=str)
+    with _trace_lock:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as fh:
+            fh.write(line + "\n")
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attrs: Any):
+    """
+    Time a block as a span. Nested spans share the trace_id of the enclosing span.
+    Yields the mutable span record so callers can attach attributes (e.g. token counts).
+    """
+    parent = _current_span.get()
+    record: Dict[str, Any] = {
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "kind": kind,
+        "start": time.time(),
+        "attrs": dict(attrs),
+    }
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        status = "error"
+        record["error"] = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        duration = time.perf_counter() - started
+        record["duration_ms"] = round(duration * 1000, 3)
+        record["status"] = status
+        METRICS.observe("span_duration_seconds", duration, kind=kind, name=name)
+        METRICS.inc("spans_total", kind=kind, name=name, status=status)
+        _export_span(record)
+
+
+def traced_tool(func):
+    """
+    Decorator that wraps a (sync or async) tool function in a kind="tool" span.
+    functools.wraps keeps the signature/docstring ADK uses to build the tool schema.
+    """
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(func.__name__, kind="tool"):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__, kind="tool"):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def record_tokens(agent_name: str, usage: Any, record: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Count prompt/completion tokens from a google.genai usage_metadata object.
+    """
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_token_count", None) or 0
+    completion = getattr(usage, "candidates_token_count", None) or 0
+    if prompt:
+        METRICS.inc("llm_tokens_total", prompt, agent=agent_name, type="prompt")
+    if completion:
+        METRICS.inc("llm_tokens_total", completion, agent=agent_name, type="completion")
+    if record is not None:
+        attrs = record.setdefault("attrs", {})
+        attrs["prompt_tokens"] = attrs.get("prompt_tokens", 0) + prompt
+        attrs["completion_tokens"] = attrs.get("completion_tokens", 0) + completion
+
+
+def record_fallback(source: str, reason: str = "error") -> None:
+    """
+    Count a fallback from a live upstream to local data (and tag the current span).
+    """
+    METRICS.inc("fallback_total", source=source, reason=reason)
+    current = _current_span.get()
+    if current is not None:
+        current["attrs"]["fallback"] = reason
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    METRICS.inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+async def metrics_endpoint(request):
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def mount_metrics(app) -> Any:
+    """
+    Attach a Prometheus-style GET /metrics route to a Starlette app (e.g. from to_a2a).
+    """
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+    return app
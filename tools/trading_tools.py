@@ -2,10 +2,13 @@ from typing import Dict
 
 from google.adk.tools.tool_context import ToolContext
 
+from tools.telemetry import traced_tool
+
 # Threshold for triggering human approval (percentage of portfolio)
 CONFIRM_THRESHOLD_PCT = 20
 
 
+@traced_tool
 def propose_trade_execution(trade_plan: Dict, user_profile: Dict, tool_context: ToolContext) -> Dict:
     """
     Paper-trade execution gate with optional human approval.